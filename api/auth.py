@@ -3,45 +3,61 @@ DevMesh Platform - API Key Authentication Middleware (B1)
 
 Checks X-API-Key header on protected endpoints.
 Gated by API_AUTH_ENABLED env var for safe rollout.
+
+Implemented as plain ASGI middleware: a header check doesn't need the
+extra task and Request/Response wrapping that BaseHTTPMiddleware adds
+to every request.
 """
 
 import os
+import hmac
 import logging
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 logger = logging.getLogger(__name__)
 
 # Paths that never require authentication
-PUBLIC_PATHS = {"/health", "/info", "/", "/docs", "/openapi.json", "/redoc", "/favicon.ico"}
+PUBLIC_PATHS = frozenset({"/health", "/info", "/", "/docs", "/openapi.json", "/redoc", "/favicon.ico"})
 
 
-class APIKeyMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Check if auth is enabled
-        if not os.getenv("API_AUTH_ENABLED", "false").lower() in ("true", "1", "yes"):
-            return await call_next(request)
+class APIKeyMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # Resolved once when the middleware stack is built, not per request
+        self._enabled = os.getenv("API_AUTH_ENABLED", "false").lower() in ("true", "1", "yes")
+        expected_key = os.getenv("API_KEY")
+        self._expected_key = expected_key.encode() if expected_key else None
 
-        # Skip auth for public paths
-        if request.url.path in PUBLIC_PATHS:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Pass through non-HTTP traffic, disabled auth, and public paths
+        if scope["type"] != "http" or not self._enabled or scope["path"] in PUBLIC_PATHS:
+            await self.app(scope, receive, send)
+            return
 
-        # Get expected key
-        expected_key = os.getenv("API_KEY")
-        if not expected_key:
+        if self._expected_key is None:
             logger.warning("API_AUTH_ENABLED=true but API_KEY not set; rejecting all protected requests")
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=500,
                 content={"error_code": "AUTH_NOT_CONFIGURED", "message": "Server authentication not configured"},
             )
-
-        # Validate header
-        provided_key = request.headers.get("X-API-Key")
-        if not provided_key or provided_key != expected_key:
-            return JSONResponse(
+            await response(scope, receive, send)
+            return
+
+        # Validate header (raw ASGI headers are lowercased bytes)
+        provided_key = None
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                provided_key = value
+                break
+
+        # Constant-time compare to avoid timing side channel
+        if not provided_key or not hmac.compare_digest(provided_key, self._expected_key):
+            response = JSONResponse(
                 status_code=401,
                 content={"error_code": "UNAUTHORIZED", "message": "Invalid or missing API key"},
             )
+            await response(scope, receive, send)
+            return
 
-        return await call_next(request)
+        await self.app(scope, receive, send)
@@ -3,13 +3,23 @@ DevMesh Platform - API Routes
 Ingestion and query endpoints (async with connection pool)
 """
 
-import json
+import os
+import asyncio
 import hashlib
 import logging
+import time
+from array import array
 from datetime import datetime
-from typing import List, Optional
-
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Optional, Sequence
+
+import aiomysql
+import orjson
+import pymysql.converters
+import xxhash
 from fastapi import APIRouter, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
 
 from models.schemas import (
     LogEventCreate,
@@ -21,172 +31,408 @@ from models.schemas import (
     TemplateSearchResult,
 )
 from db.database import get_pool
-from services.embedding import embed_batch, embed_text
+from services.embedding import embed_batch, embed_batch_cached, embed_text, embed_text_cached
 from services.canonicalize import template_key
-from errors import EmptyBatchError, IngestionError, QueryError, DatabaseConnectionError
+from errors import (
+    EmptyBatchError, IngestionError, QueryError, DatabaseConnectionError, ConfigurationError,
+)
 
 logger = logging.getLogger(__name__)
 
 
-def _vec_to_text(vec: list[float]) -> str:
+# Upper bound on a single multi-row INSERT statement. Well under MariaDB's
+# default max_allowed_packet (16MB) even for rows carrying 4096-dim vectors;
+# lower it on servers configured with a smaller packet limit.
+_MAX_INSERT_BYTES = int(os.getenv("INGEST_MAX_INSERT_BYTES", str(4 * 1024 * 1024)))
+# Row cap per statement, so one huge batch of small rows doesn't become a
+# single long-running INSERT holding its locks and undo log
+_MAX_INSERT_ROWS = int(os.getenv("INGEST_MAX_INSERT_ROWS", "1000"))
+
+
+def _vec_to_text(vec: Sequence[float]) -> str:
     """Convert a list of floats to MariaDB VECTOR text format."""
-    return "[" + ",".join(str(f) for f in vec) + "]"
+    # orjson emits the same "[f,f,...]" text VEC_FromText parses, ~20x faster
+    # than str() per float at 4096 dims (cached embeddings arrive as arrays)
+    if isinstance(vec, array):
+        vec = vec.tolist()
+    return orjson.dumps(vec).decode()
 
 
-# =============================================================================
-# Schema Cache
-# =============================================================================
-_has_hash_column: Optional[bool] = None
-_has_embedding_column: Optional[bool] = None
-_has_templates_table: Optional[bool] = None
-_has_template_id_column: Optional[bool] = None
+class _VectorLiteral:
+    """VECTOR text for a VEC_FromText(%s) parameter that skips string escaping.
 
+    Only _vec_literal builds these, from a float array, so the text holds only
+    JSON number syntax (digits, sign, '.', 'e', ',' and brackets) and quoting it
+    verbatim is safe. escape_string over a 4096-dim vector (40-85KB) costs as
+    much as encoding it, once per row.
 
-async def _check_hash_column_exists() -> bool:
-    """Check if log_hash column exists (cached after first check)."""
-    global _has_hash_column
-    if _has_hash_column is not None:
-        return _has_hash_column
+    This is the module's one entry in pymysql's process-wide encoder table:
+    aiomysql's Connection.escape() ignores per-connection encoders.
+    """
 
-    try:
-        pool = get_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                await cursor.execute("""
-                    SELECT COUNT(*) as cnt
-                    FROM information_schema.columns
-                    WHERE table_schema = DATABASE()
-                      AND table_name = 'log_events'
-                      AND column_name = 'log_hash'
-                """)
-                row = await cursor.fetchone()
-                _has_hash_column = row['cnt'] > 0
-        logger.info("Schema check: log_hash column %s", 'exists' if _has_hash_column else 'missing')
-    except Exception as e:
-        logger.warning("Failed to check schema, assuming no hash column: %s", e)
-        _has_hash_column = False
+    __slots__ = ("text",)
 
-    return _has_hash_column
+    def __init__(self, text: str):
+        self.text = text
 
+    def __repr__(self) -> str:
+        return repr(self.text)
 
-async def _check_embedding_column_exists() -> bool:
-    """Check if embedding_vector column exists (cached after first check)."""
-    global _has_embedding_column
-    if _has_embedding_column is not None:
-        return _has_embedding_column
 
-    try:
-        pool = get_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                await cursor.execute("""
-                    SELECT COUNT(*) as cnt
-                    FROM information_schema.columns
-                    WHERE table_schema = DATABASE()
-                      AND table_name = 'log_events'
-                      AND column_name = 'embedding_vector'
-                """)
-                row = await cursor.fetchone()
-                _has_embedding_column = row['cnt'] > 0
-        logger.info("Schema check: embedding_vector column %s",
-                     'exists' if _has_embedding_column else 'missing')
-    except Exception as e:
-        logger.warning("Failed to check schema, assuming no embedding column: %s", e)
-        _has_embedding_column = False
+# aiomysql/pymysql escape non-str parameters through this mapping
+pymysql.converters.encoders[_VectorLiteral] = lambda v, mapping=None: "'" + v.text + "'"
 
-    return _has_embedding_column
 
+def _vec_literal(vec: Sequence[float]) -> _VectorLiteral:
+    """_vec_to_text() wrapped for bulk INSERT parameters.
 
-async def _check_templates_table_exists() -> bool:
-    """Check if log_templates table exists (cached after first check)."""
-    global _has_templates_table
-    if _has_templates_table is not None:
-        return _has_templates_table
+    Raw gateway lists are coerced through array('d') first, which raises
+    TypeError on any non-number, since the literal bypasses escaping.
+    """
+    if not isinstance(vec, array):
+        vec = array("d", vec)
+    return _VectorLiteral(_vec_to_text(vec))
 
-    try:
-        pool = get_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                await cursor.execute("""
-                    SELECT COUNT(*) as cnt
-                    FROM information_schema.tables
-                    WHERE table_schema = DATABASE()
-                      AND table_name = 'log_templates'
-                """)
-                row = await cursor.fetchone()
-                _has_templates_table = row['cnt'] > 0
-        logger.info("Schema check: log_templates table %s",
-                     'exists' if _has_templates_table else 'missing')
-    except Exception as e:
-        logger.warning("Failed to check schema, assuming no templates table: %s", e)
-        _has_templates_table = False
 
-    return _has_templates_table
+async def _execute_multirow(cursor, prefix: str, row_sql: str, rows: list[tuple]) -> int:
+    """Insert rows with multi-row VALUES statements, one round-trip per chunk.
 
+    aiomysql only rewrites executemany() into a multi-row INSERT when every
+    placeholder is a bare %s, so a VALUES list containing VEC_FromText(%s)
+    silently degrades to one statement per row. Build the VALUES list here
+    instead, splitting on _MAX_INSERT_BYTES and _MAX_INSERT_ROWS.
 
-async def _check_template_id_column_exists() -> bool:
-    """Check if template_id column exists on log_events (cached)."""
-    global _has_template_id_column
-    if _has_template_id_column is not None:
-        return _has_template_id_column
+    Args:
+        cursor: Open aiomysql cursor
+        prefix: Statement up to and including "VALUES "
+        row_sql: Parenthesized placeholder group for one row
+        rows: Parameter tuples, one per row
+
+    Returns:
+        Total affected row count across all chunks.
+    """
+    affected = 0
+    values: list[str] = []
+    size = len(prefix)
+    for row in rows:
+        value = cursor.mogrify(row_sql, row)
+        if values and (size + len(value) + 1 > _MAX_INSERT_BYTES
+                       or len(values) >= _MAX_INSERT_ROWS):
+            await cursor.execute(prefix + ",".join(values))
+            affected += cursor.rowcount
+            values, size = [], len(prefix)
+        values.append(value)
+        size += len(value) + 1
+    if values:
+        await cursor.execute(prefix + ",".join(values))
+        affected += cursor.rowcount
+    return affected
 
+
+# =============================================================================
+# Schema Cache
+# =============================================================================
+# Plain booleans read directly by the routes once _schema_loaded is set, so
+# the steady-state request path costs one branch rather than an await
+_schema_loaded = False
+_has_hash_column = False
+_has_event_hash_column = False
+_has_embedding_column = False
+_has_templates_table = False
+_has_template_id_column = False
+# Set only when the probe succeeded and log_events has no columns at all
+_log_events_missing = False
+_schema_lock = asyncio.Lock()
+# After a failed probe, callers skip re-probing until this monotonic time
+_SCHEMA_RETRY_SECONDS = 30
+_schema_retry_at = 0.0
+
+# Every optional schema feature in one round-trip; log_templates is detected
+# through its id column. log_events.id is probed too, so an unmigrated database
+# is caught at startup. One branch per table: MariaDB only takes the
+# information_schema fast path (open just the named table instead of every
+# table in the schema) for top-level table_schema/table_name equalities,
+# which an OR across the two tables would defeat. The unique idx_event_hash is
+# probed as well: event_hash without it (a half-applied migration 004) dedups
+# nothing, so ingest must keep writing log_hash.
+_SCHEMA_PROBE_SQL = """
+    SELECT table_name AS tbl, column_name AS col
+    FROM information_schema.columns
+    WHERE table_schema = DATABASE() AND table_name = 'log_events'
+      AND column_name IN ('id', 'log_hash', 'event_hash', 'embedding_vector', 'template_id')
+    UNION ALL
+    SELECT table_name, column_name
+    FROM information_schema.columns
+    WHERE table_schema = DATABASE() AND table_name = 'log_templates'
+      AND column_name = 'id'
+    UNION ALL
+    SELECT table_name, index_name
+    FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'log_events'
+      AND index_name = 'idx_event_hash' AND non_unique = 0
+"""
+
+
+async def warm_schema_cache() -> None:
+    """Resolve schema flags and build the ingest plan at startup, so the first
+    ingest doesn't pay for either.
+
+    Skipped when the pool failed to initialise, so a DB outage at boot doesn't
+    pin the flags to False — the lazy per-request check still applies then.
+
+    Raises:
+        ConfigurationError: the database is reachable but has no log_events
+            table, so every ingest and query would fail.
+    """
     try:
-        pool = get_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                await cursor.execute("""
-                    SELECT COUNT(*) as cnt
-                    FROM information_schema.columns
-                    WHERE table_schema = DATABASE()
-                      AND table_name = 'log_events'
-                      AND column_name = 'template_id'
-                """)
-                row = await cursor.fetchone()
-                _has_template_id_column = row['cnt'] > 0
-        logger.info("Schema check: template_id column %s",
-                     'exists' if _has_template_id_column else 'missing')
-    except Exception as e:
-        logger.warning("Failed to check schema, assuming no template_id column: %s", e)
-        _has_template_id_column = False
+        get_pool()
+    except RuntimeError:
+        return
+    await _load_schema_flags()
+    if _log_events_missing:
+        raise ConfigurationError(
+            "log_events table not found; run `python -m db.database` and the "
+            "db/migrations scripts before starting the API"
+        )
+    if _schema_loaded:
+        # Generate the INSERT text and row builder now rather than on the
+        # first ingest request
+        _current_ingest_plan()
 
-    return _has_template_id_column
+
+async def _load_schema_flags() -> None:
+    """Resolve all schema flags with one query. Callers check _schema_loaded first.
+
+    Concurrent first callers wait on a lock so the probe runs once. A failed
+    probe leaves every flag False for now but does not mark the cache loaded;
+    it is retried after _SCHEMA_RETRY_SECONDS, so a DB blip at startup doesn't
+    pin ingest to the no-dedup path for the life of the worker.
+    """
+    global _schema_loaded, _schema_retry_at, _has_hash_column, _has_event_hash_column
+    global _has_embedding_column, _has_templates_table, _has_template_id_column
+    global _log_events_missing
+    if _schema_loaded or time.monotonic() < _schema_retry_at:
+        return
+    async with _schema_lock:
+        if _schema_loaded or time.monotonic() < _schema_retry_at:
+            return
+        try:
+            async with get_pool().acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(_SCHEMA_PROBE_SQL)
+                    rows = await cursor.fetchall()
+        except Exception as e:
+            logger.warning("Schema check failed, retrying in %ds: %s",
+                           _SCHEMA_RETRY_SECONDS, e)
+            _schema_retry_at = time.monotonic() + _SCHEMA_RETRY_SECONDS
+            return
+
+        found = {(row['tbl'], row['col']) for row in rows}
+        _log_events_missing = not any(tbl == "log_events" for tbl, _ in found)
+        _has_hash_column = ("log_events", "log_hash") in found
+        _has_event_hash_column = {("log_events", "event_hash"),
+                                  ("log_events", "idx_event_hash")} <= found
+        _has_embedding_column = ("log_events", "embedding_vector") in found
+        _has_templates_table = ("log_templates", "id") in found
+        _has_template_id_column = ("log_events", "template_id") in found
+        logger.info(
+            "Schema check: log_hash=%s event_hash=%s embedding_vector=%s "
+            "log_templates=%s template_id=%s",
+            _has_hash_column, _has_event_hash_column, _has_embedding_column,
+            _has_templates_table, _has_template_id_column,
+        )
+        _schema_loaded = True
+
+
+# Dedup hash algorithm for log_hash: "sha256" (default) or the faster "xxh3".
+# Both yield 16 hex chars but never the same ones, so xxh3 is opt-in: switching
+# an existing table lets every re-sent log past the unique index.
+LOG_HASH_ALGO = os.getenv("LOG_HASH_ALGO", "sha256")
+# Fail at import: a typo silently falling back to the other algorithm would
+# stop new hashes matching stored ones and let every duplicate through
+if LOG_HASH_ALGO not in ("xxh3", "sha256"):
+    raise ConfigurationError(
+        f"LOG_HASH_ALGO must be 'xxh3' or 'sha256', got {LOG_HASH_ALGO!r}",
+        config_key="LOG_HASH_ALGO",
+    )
 
 
 def compute_log_hash(log: LogEventCreate) -> str:
     """Compute a 16-char hex hash for deduplication."""
-    content = f"{log.timestamp}|{log.host}|{log.service}|{log.message}"
-    return hashlib.sha256(content.encode()).hexdigest()[:16]
+    # One join + encode; same bytes as the original f-string, so hashes are stable
+    content = "|".join((str(log.timestamp), log.host, log.service, log.message)).encode()
+    if LOG_HASH_ALGO == "sha256":
+        return hashlib.sha256(content).hexdigest()[:16]
+    return xxhash.xxh3_64_hexdigest(content)
+
+
+def compute_log_hashes(logs: list[LogEventCreate]) -> list[str]:
+    """Compute compute_log_hash() for a whole batch in one comprehension.
+
+    Hashing is negligible under xxh3; about 70% of the per-log cost is
+    str(timestamp), so this binds datetime.isoformat (what str() dispatches to)
+    and the digest function once instead of resolving them per call.
+    """
+    isoformat = datetime.isoformat
+    if LOG_HASH_ALGO == "sha256":
+        sha256 = hashlib.sha256
+        return [
+            sha256("|".join((isoformat(log.timestamp, " "), log.host, log.service, log.message))
+                   .encode()).hexdigest()[:16]
+            for log in logs
+        ]
+    digest = xxhash.xxh3_64_hexdigest
+    return [
+        digest("|".join((isoformat(log.timestamp, " "), log.host, log.service, log.message)).encode())
+        for log in logs
+    ]
 
 
 router = APIRouter()
 
+# LogLevel member -> DB level string for ingest; a dict hit is ~4x cheaper than the Enum.value descriptor
+_VALUE_BY_LEVEL = {m: m.value for m in LogLevel}
 
-def _build_row(log: LogEventCreate, has_hash: bool, embedding: Optional[list[float]] = None,
-               has_embedding: bool = False, template_id: Optional[int] = None,
-               has_template_id: bool = False):
-    """Build a parameter tuple for one log row."""
-    meta_json_str = json.dumps(log.meta_json) if log.meta_json else None
-    base = (
-        log.timestamp,
-        log.source,
-        log.service,
-        log.host,
-        log.level.value,
-        log.trace_id,
-        log.span_id,
-        log.event_type,
-        log.error_code,
-        log.message,
-        meta_json_str,
-    )
-    if has_hash:
-        base = (compute_log_hash(log),) + base
+# Columns always written by ingest, in _row_builder order
+_BASE_INSERT_COLUMNS = (
+    "timestamp", "source", "service", "host", "level",
+    "trace_id", "span_id", "event_type", "error_code",
+    "message", "meta_json",
+)
+
+
+@lru_cache(maxsize=None)
+def _insert_statement(has_hash: bool, use_embedding: bool,
+                      has_template_id: bool, ignore_dups: bool) -> tuple[str, str]:
+    """Build the log_events INSERT for one schema shape (cached per flag combination).
+
+    Returns:
+        Tuple of (statement prefix up to "VALUES ", placeholder group for one row)
+    """
+    columns = (("log_hash",) if has_hash else ()) + _BASE_INSERT_COLUMNS
+    ph = ["%s"] * len(columns)
+    if use_embedding:
+        columns += ("embedding_vector",)
+        ph.append("VEC_FromText(%s)")
+    if has_template_id:
+        columns += ("template_id",)
+        ph.append("%s")
+
+    ignore = "IGNORE " if ignore_dups else ""
+    prefix = f"INSERT {ignore}INTO log_events ({', '.join(columns)}) VALUES "
+    return prefix, "(" + ", ".join(ph) + ")"
+
+
+# Row expression for each _BASE_INSERT_COLUMNS entry, used by _row_builder.
+# meta_json is serialized here with orjson rather than via a driver-level dict
+# encoder; the process-wide table is reserved for _VectorLiteral.
+_BASE_ROW_EXPRS = (
+    "f['timestamp']", "f['source']", "f['service']", "f['host']",
+    "_VALUE_BY_LEVEL[f['level']]",
+    "f['trace_id']", "f['span_id']", "f['event_type']", "f['error_code']",
+    "f['message']",
+    "(orjson.dumps(f['meta_json']).decode() if f['meta_json'] else None)",
+)
+
+
+@lru_cache(maxsize=None)
+def _row_builder(has_hash: bool, has_embedding: bool, has_template_id: bool):
+    """Return a parameter-tuple builder for one schema shape (cached per flag combination).
+
+    Generated so each shape emits its row as a single tuple literal, with no
+    per-row flag branches or tuple concatenation. Fields are read from the
+    model's __dict__ (``f``), about twice as fast as Pydantic attribute access.
+    Column order matches _insert_statement(). Names resolve against this
+    module's globals at call time.
+
+    Returns:
+        Callable (log, log_hash, embedding, template_id) -> tuple
+    """
+    exprs = (("log_hash",) if has_hash else ()) + _BASE_ROW_EXPRS
     if has_embedding:
-        emb_blob = _vec_to_text(embedding) if embedding else None
-        base = base + (emb_blob,)
+        exprs += ("(_vec_literal(embedding) if embedding else None)",)
     if has_template_id:
-        base = base + (template_id,)
-    return base
+        exprs += ("template_id",)
+    source = (
+        "def build_row(log, log_hash, embedding, template_id):\n"
+        "    f = log.__dict__\n"
+        f"    return ({', '.join(exprs)},)\n"
+    )
+    namespace: dict = {}
+    exec(source, globals(), namespace)
+    return namespace["build_row"]
+
+
+_TEMPLATE_INSERT_PREFIX = """
+    INSERT IGNORE INTO log_templates
+        (template_hash, canonical_text, service, level,
+         embedding_vector, canon_version, canon_hash,
+         first_seen, last_seen, event_count, source_hosts)
+    VALUES """
+_TEMPLATE_ROW_SQL = "(%s, %s, %s, %s, VEC_FromText(%s), %s, %s, %s, %s, %s, %s)"
+
+
+@lru_cache(maxsize=None)
+def _ingest_plan(has_hash_column: bool, has_event_hash: bool, has_embedding: bool,
+                 has_templates: bool, has_template_id: bool):
+    """Derive everything ingest needs from the schema flags (cached per combination).
+
+    The flags are fixed once loaded, so after the first request this is a single
+    cache hit instead of re-deriving the switches, SQL and row builder.
+
+    Returns:
+        Tuple of (use_templates, use_embedding, compute_hash, dedup,
+        insert_prefix, row_sql, build_row)
+    """
+    use_templates = has_templates and has_template_id
+    # If templates are active, skip per-row embedding on log_events
+    use_embedding = has_embedding and not use_templates
+    # With the DB-computed event_hash unique index, MariaDB dedups on its own
+    # and the per-row Python log_hash is skipped entirely
+    dedup = has_hash_column or has_event_hash
+    compute_hash = has_hash_column and not has_event_hash
+    insert_prefix, row_sql = _insert_statement(compute_hash, use_embedding, has_template_id, dedup)
+    build_row = _row_builder(compute_hash, use_embedding, has_template_id)
+    return (use_templates, use_embedding, compute_hash, dedup,
+            insert_prefix, row_sql, build_row)
+
+
+def _current_ingest_plan():
+    """_ingest_plan() for the currently loaded schema flags."""
+    return _ingest_plan(
+        _has_hash_column, _has_event_hash_column, _has_embedding_column,
+        _has_templates_table, _has_template_id_column,
+    )
+
+
+async def _bump_template_counts(cursor, hash_counts: dict[str, tuple[int, datetime]]) -> None:
+    """Add a batch's event counts and last_seen to existing log_templates rows.
+
+    Runs on the caller's cursor; the caller commits.
+
+    Args:
+        cursor: aiomysql cursor
+        hash_counts: template_hash -> (events in this batch, latest timestamp)
+    """
+    if not hash_counts:
+        return
+    # One UPDATE for every touched template: CASE picks each row's increment
+    # and timestamp. Not INSERT ... ON DUPLICATE KEY UPDATE, which would need
+    # values for every NOT NULL column.
+    cases = " ".join(["WHEN %s THEN %s"] * len(hash_counts))
+    placeholders = ", ".join(["%s"] * len(hash_counts))
+    params: list = []
+    for t_hash, (cnt, _) in hash_counts.items():
+        params += (t_hash, cnt)
+    for t_hash, (_, max_ts) in hash_counts.items():
+        params += (t_hash, max_ts)
+    params += hash_counts.keys()
+    await cursor.execute(f"""
+        UPDATE log_templates
+        SET event_count = event_count + CASE template_hash {cases} END,
+            last_seen = GREATEST(last_seen, CASE template_hash {cases} END)
+        WHERE template_hash IN ({placeholders})
+    """, params)
 
 
 async def _resolve_templates(request: Request, pool, logs: list[LogEventCreate]):
@@ -199,21 +445,25 @@ async def _resolve_templates(request: Request, pool, logs: list[LogEventCreate])
     if template_cache is None:
         return [None] * len(logs)
 
-    # Step 1: Canonicalize each message, compute template_hash
-    keys = []
+    # Step 1: Canonicalize each message and, in the same pass, dedupe within
+    # the batch and count events per template (existing templates get an
+    # UPDATE, new ones are inserted with their count)
+    log_hashes: list[str] = []
+    unique_hashes: dict[str, tuple[str, str, LogEventCreate]] = {}
+    hash_counts: dict[str, tuple[int, datetime]] = {}
     for log in logs:
         canonical, t_hash, version = template_key(
             log.message, log.service, log.level.value
         )
-        keys.append((canonical, t_hash, version, log))
-
-    # Step 2: Deduplicate within batch — collect unique hashes
-    unique_hashes = {}
-    for canonical, t_hash, version, log in keys:
-        if t_hash not in unique_hashes:
+        log_hashes.append(t_hash)
+        counted = hash_counts.get(t_hash)
+        if counted is None:
             unique_hashes[t_hash] = (canonical, version, log)
+            hash_counts[t_hash] = (1, log.timestamp)
+        else:
+            hash_counts[t_hash] = (counted[0] + 1, max(counted[1], log.timestamp))
 
-    # Step 3: Cache lookup for each unique hash
+    # Step 2: Cache lookup for each unique hash
     resolved: dict[str, int] = {}
     cache_misses: list[str] = []
     for t_hash in unique_hashes:
@@ -223,108 +473,83 @@ async def _resolve_templates(request: Request, pool, logs: list[LogEventCreate])
         else:
             cache_misses.append(t_hash)
 
-    # Step 4: DB lookup for cache misses
-    if cache_misses:
+    # Step 3: DB lookup for cache misses, then the counter UPDATE for every
+    # template known so far, on one connection. It is released before the
+    # embedding RPC so no connection sits idle across that call.
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                if cache_misses:
+                    try:
+                        placeholders = ", ".join(["%s"] * len(cache_misses))
+                        await cursor.execute(
+                            f"SELECT id, template_hash FROM log_templates WHERE template_hash IN ({placeholders})",
+                            cache_misses,
+                        )
+                        for row in await cursor.fetchall():
+                            resolved[row['template_hash']] = row['id']
+                            template_cache.put(row['template_hash'], row['id'])
+                        # One filtering pass rather than list.remove() per found row
+                        cache_misses = [h for h in cache_misses if h not in resolved]
+                    except Exception as e:
+                        logger.warning("Template DB lookup failed: %s", e)
+                await _bump_template_counts(
+                    cursor, {h: c for h, c in hash_counts.items() if h in resolved},
+                )
+            await conn.commit()
+    except Exception as e:
+        logger.warning("Template counter update failed: %s", e)
+
+    # Step 4: Embed only truly new canonical texts
+    http_client = getattr(request.app.state, "http_client", None)
+    if cache_misses and http_client:
+        new_texts = [unique_hashes[h][0] for h in cache_misses]
         try:
-            async with pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    placeholders = ", ".join(["%s"] * len(cache_misses))
-                    await cursor.execute(
-                        f"SELECT id, template_hash FROM log_templates WHERE template_hash IN ({placeholders})",
-                        cache_misses,
-                    )
-                    rows = await cursor.fetchall()
-                    for row in rows:
-                        resolved[row['template_hash']] = row['id']
-                        template_cache.put(row['template_hash'], row['id'])
-                        cache_misses.remove(row['template_hash'])
+            new_embeddings = await embed_batch(http_client, new_texts)
         except Exception as e:
-            logger.warning("Template DB lookup failed: %s", e)
-
-    # Step 5: Embed only truly new canonical texts
-    if cache_misses:
-        http_client = getattr(request.app.state, "http_client", None)
-        if http_client:
-            new_texts = [unique_hashes[h][0] for h in cache_misses]
-            try:
-                new_embeddings = await embed_batch(http_client, new_texts)
-            except Exception as e:
-                logger.warning("Template embedding failed: %s", e)
-                new_embeddings = [None] * len(new_texts)
-
-            # Step 6: Insert new templates
+            logger.warning("Template embedding failed: %s", e)
+            new_embeddings = [None] * len(new_texts)
+
+        # Step 5: Insert new templates in one multi-row statement. lastrowid
+        # only covers the first row, so ids are mapped back with one SELECT.
+        # IGNORE: a template another worker created since the Step 3 lookup
+        # no longer aborts the batch; the SELECT picks up its id instead.
+        template_rows = []
+        for t_hash, emb in zip(cache_misses, new_embeddings):
+            if emb is None:
+                continue  # Can't insert without embedding (NOT NULL)
+            canonical, version, log = unique_hashes[t_hash]
+            canon_hash_val = hashlib.sha256(canonical.encode()).hexdigest()[:32]
+            cnt, last_seen = hash_counts[t_hash]
+            template_rows.append((
+                t_hash, canonical, log.service, log.level.value,
+                _vec_literal(emb), version, canon_hash_val,
+                log.timestamp, last_seen, cnt, orjson.dumps([log.host]).decode(),
+            ))
+
+        if template_rows:
             try:
                 async with pool.acquire() as conn:
                     async with conn.cursor() as cursor:
-                        for i, t_hash in enumerate(cache_misses):
-                            canonical, version, log = unique_hashes[t_hash]
-                            emb = new_embeddings[i] if i < len(new_embeddings) else None
-                            if emb is None:
-                                continue  # Can't insert without embedding (NOT NULL)
-
-                            canon_hash_val = hashlib.sha256(canonical.encode()).hexdigest()[:32]
-                            emb_text = _vec_to_text(emb)
-                            now = log.timestamp
-
-                            await cursor.execute("""
-                                INSERT INTO log_templates
-                                    (template_hash, canonical_text, service, level,
-                                     embedding_vector, canon_version, canon_hash,
-                                     first_seen, last_seen, event_count, source_hosts)
-                                VALUES (%s, %s, %s, %s, VEC_FromText(%s), %s, %s,
-                                        %s, %s, 1, %s)
-                            """, (
-                                t_hash, canonical, log.service, log.level.value,
-                                emb_text, version, canon_hash_val,
-                                now, now, json.dumps([log.host]),
-                            ))
-                            new_id = cursor.lastrowid
-                            resolved[t_hash] = new_id
-                            template_cache.put(t_hash, new_id)
+                        await _execute_multirow(
+                            cursor, _TEMPLATE_INSERT_PREFIX, _TEMPLATE_ROW_SQL, template_rows,
+                        )
+                        new_hashes = [row[0] for row in template_rows]
+                        placeholders = ", ".join(["%s"] * len(new_hashes))
+                        await cursor.execute(
+                            f"SELECT id, template_hash FROM log_templates WHERE template_hash IN ({placeholders})",
+                            new_hashes,
+                        )
+                        for row in await cursor.fetchall():
+                            resolved[row['template_hash']] = row['id']
+                            template_cache.put(row['template_hash'], row['id'])
 
                     await conn.commit()
             except Exception as e:
                 logger.warning("Template insert failed: %s", e)
 
-    # Step 8: Batch update event_count and last_seen on existing templates
-    # (collect hashes that were already in DB, not newly created)
-    existing_hashes = [
-        (t_hash, keys_entry[3].timestamp)  # log.timestamp
-        for keys_entry in keys
-        for t_hash_check in [keys_entry[1]]
-        if t_hash_check in resolved
-        for t_hash in [t_hash_check]
-    ]
-    if existing_hashes:
-        try:
-            async with pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    # Count per template_hash for this batch
-                    hash_counts: dict[str, tuple[int, datetime]] = {}
-                    for t_hash, ts in existing_hashes:
-                        if t_hash in hash_counts:
-                            cnt, max_ts = hash_counts[t_hash]
-                            hash_counts[t_hash] = (cnt + 1, max(max_ts, ts))
-                        else:
-                            hash_counts[t_hash] = (1, ts)
-
-                    for t_hash, (cnt, max_ts) in hash_counts.items():
-                        await cursor.execute("""
-                            UPDATE log_templates
-                            SET event_count = event_count + %s,
-                                last_seen = GREATEST(last_seen, %s)
-                            WHERE template_hash = %s
-                        """, (cnt, max_ts, t_hash))
-                await conn.commit()
-        except Exception as e:
-            logger.warning("Template counter update failed: %s", e)
-
     # Map back to per-log template IDs
-    result = []
-    for canonical, t_hash, version, log in keys:
-        result.append(resolved.get(t_hash))
-
-    return result
+    return [resolved.get(t_hash) for t_hash in log_hashes]
 
 
 @router.post(
@@ -334,80 +559,73 @@ async def _resolve_templates(request: Request, pool, logs: list[LogEventCreate])
     tags=["Ingestion"],
 )
 async def ingest_logs(request: Request, body: LogIngestRequest):
-    """Ingest batch of log events into MariaDB (async, bulk insert via executemany)."""
-    if not body.logs:
+    """Ingest batch of log events into MariaDB (async, multi-row bulk insert)."""
+    n = len(body.logs)
+    if not n:
         raise EmptyBatchError()
 
-    has_hash_column = await _check_hash_column_exists()
-    has_embedding = await _check_embedding_column_exists()
-    has_templates = await _check_templates_table_exists()
-    has_template_id = await _check_template_id_column_exists()
+    if not _schema_loaded:
+        await _load_schema_flags()
+    (use_templates, use_embedding, compute_hash, dedup,
+     insert_prefix, row_sql, build_row) = _current_ingest_plan()
 
     try:
         pool = get_pool()
     except Exception as e:
         raise DatabaseConnectionError(f"Failed to get DB pool: {e}")
 
-    # Resolve templates if the table exists
-    template_ids: list[Optional[int]] = [None] * len(body.logs)
-    skip_per_row_embedding = False
-    if has_templates and has_template_id:
-        template_ids = await _resolve_templates(request, pool, body.logs)
-        # If templates are active, skip per-row embedding on log_events
-        skip_per_row_embedding = True
-
-    # Build column list dynamically
-    columns = []
-    if has_hash_column:
-        columns.append("log_hash")
-    columns.extend([
-        "timestamp", "source", "service", "host", "level",
-        "trace_id", "span_id", "event_type", "error_code",
-        "message", "meta_json",
-    ])
-
-    use_embedding = has_embedding and not skip_per_row_embedding
-    if use_embedding:
-        columns.append("embedding_vector")
-    if has_template_id:
-        columns.append("template_id")
+    # Drop in-batch repeats (exporter retry storms) before any per-log work:
+    # they would only be embedded, counted against their template and sent,
+    # for the unique index to reject. First occurrence wins, as with IGNORE.
+    logs = body.logs
+    hashes: list[Optional[str]] = [None] * n
+    if compute_hash:
+        first_by_hash: dict[str, LogEventCreate] = {}
+        for log_hash, log in zip(compute_log_hashes(logs), logs):
+            first_by_hash.setdefault(log_hash, log)
+        hashes = list(first_by_hash)
+        logs = list(first_by_hash.values())
+    m = len(logs)
 
-    ph = ["%s"] * len(columns)
-    if use_embedding:
-        # Find embedding_vector position
-        emb_idx = columns.index("embedding_vector")
-        ph[emb_idx] = "VEC_FromText(%s)"
-    placeholders = ", ".join(ph)
-    col_list = ", ".join(columns)
-    ignore = "IGNORE " if has_hash_column else ""
-    insert_sql = f"INSERT {ignore}INTO log_events ({col_list}) VALUES ({placeholders})"
+    # Resolve templates if the table exists
+    template_ids: list[Optional[int]] = [None] * m
+    if use_templates:
+        template_ids = await _resolve_templates(request, pool, logs)
 
     # Generate embeddings if column exists and we're not using templates
-    embeddings: list[Optional[list[float]]] = [None] * len(body.logs)
+    embeddings: list[Optional[Sequence[float]]] = [None] * m
     if use_embedding:
         http_client = getattr(request.app.state, "http_client", None)
         if http_client:
-            messages = [log.message for log in body.logs]
+            messages = [log.message for log in logs]
+            embedding_cache = getattr(request.app.state, "embedding_cache", None)
             try:
-                embeddings = await embed_batch(http_client, messages)
+                if embedding_cache is not None:
+                    embeddings = await embed_batch_cached(http_client, messages, embedding_cache)
+                else:
+                    embeddings = await embed_batch(http_client, messages)
             except Exception as e:
                 logger.warning("Batch embedding failed, continuing without: %s", e)
 
     try:
-        async with pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                rows = [
-                    _build_row(log, has_hash_column, emb, use_embedding,
-                               tid, has_template_id)
-                    for log, emb, tid in zip(body.logs, embeddings, template_ids)
-                ]
-
-                await cursor.executemany(insert_sql, rows)
+        # Rows are built before acquiring, so the pooled connection is held
+        # only for the INSERT and commit, not for the CPU-bound row work
+        rows = [
+            build_row(log, log_hash, emb, tid)
+            for log, log_hash, emb, tid in zip(logs, hashes, embeddings, template_ids)
+        ]
 
-                ingested = cursor.rowcount
-                duplicates = len(rows) - ingested if has_hash_column else 0
-
-            await conn.commit()
+        async with pool.acquire() as conn:
+            try:
+                async with conn.cursor() as cursor:
+                    ingested = await _execute_multirow(cursor, insert_prefix, row_sql, rows)
+                    duplicates = n - ingested if dedup else 0
+                await conn.commit()
+            except Exception:
+                # Drop any chunks already sent. The pool closes connections
+                # released mid-transaction, so this also keeps it reusable.
+                await conn.rollback()
+                raise
 
         logger.info("Ingested %d logs (%d duplicates skipped)", ingested, duplicates)
 
@@ -424,11 +642,132 @@ async def ingest_logs(request: Request, body: LogIngestRequest):
         raise IngestionError(
             message="Batch ingestion failed",
             ingested=0,
-            failed=len(body.logs),
+            failed=n,
             errors=[str(e)],
         )
 
 
+# SELECT column order in query_logs; also the response keys
+_QUERY_COLUMNS = (
+    "id", "timestamp", "source", "service", "host", "level",
+    "trace_id", "span_id", "event_type", "error_code",
+    "message", "meta_json",
+)
+_STREAM_CHUNK_ROWS = 500
+
+# query_logs filter predicates; bit i of the mask is set when filter i is present
+_QUERY_FILTERS = (
+    "service = %s",
+    "host = %s",
+    "level = %s",
+    "timestamp >= %s",
+    "timestamp <= %s",
+)
+
+
+def _filter_params(values: tuple) -> tuple[int, list]:
+    """Return (bitmask of present filters, their params in filter order)."""
+    mask = 0
+    params: list = []
+    for bit, value in enumerate(values):
+        if value:
+            mask |= 1 << bit
+            params.append(value)
+    return mask, params
+
+
+def _where_sql(filters: tuple[str, ...], mask: int, base: tuple[str, ...] = ()) -> str:
+    """Build the WHERE clause for the base predicates and the filters selected by mask.
+
+    Returns "" when nothing applies, so unfiltered shapes carry no WHERE at all.
+    Absent filters are left out rather than bound as `(%s IS NULL OR col = %s)`,
+    which would keep the optimizer off the service/host/level indexes.
+    """
+    where_clauses = list(base) + [clause for bit, clause in enumerate(filters) if mask & (1 << bit)]
+    return "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+
+
+def _build_query_logs_sql(mask: int) -> str:
+    """Build the query_logs SELECT for one combination of present filters."""
+    return f"""
+        SELECT {', '.join(_QUERY_COLUMNS)}
+        FROM log_events
+        {_where_sql(_QUERY_FILTERS, mask)}
+        ORDER BY timestamp DESC
+        LIMIT %s OFFSET %s
+    """
+
+
+def _build_search_logs_sql(mask: int) -> str:
+    """Build the search_logs SELECT for one combination of present filters."""
+    return f"""
+        SELECT {', '.join(_QUERY_COLUMNS)},
+               VEC_DISTANCE_COSINE(embedding_vector, VEC_FromText(%s)) as distance
+        FROM log_events
+        {_where_sql(_QUERY_FILTERS, mask, ("embedding_vector IS NOT NULL",))}
+        ORDER BY distance
+        LIMIT %s
+    """
+
+
+# search_templates filter predicates, same bitmask scheme
+_TEMPLATE_FILTERS = (
+    "service = %s",
+    "level = %s",
+)
+
+
+def _build_search_templates_sql(mask: int) -> str:
+    """Build the search_templates SELECT for one combination of present filters."""
+    return f"""
+        SELECT id, canonical_text, service, level, event_count,
+               VEC_DISTANCE_COSINE(embedding_vector, VEC_FromText(%s)) as distance
+        FROM log_templates
+        {_where_sql(_TEMPLATE_FILTERS, mask)}
+        ORDER BY distance
+        LIMIT %s
+    """
+
+
+# One search_templates example lookup; the route joins a branch per matched
+# template with UNION ALL. Each branch keeps the idx_template_id + LIMIT plan.
+_TEMPLATE_EXAMPLES_BRANCH = f"""
+    (SELECT {', '.join(_QUERY_COLUMNS)}, template_id
+     FROM log_events
+     WHERE template_id = %s
+     ORDER BY timestamp DESC
+     LIMIT %s)
+"""
+
+
+# Every statement shape, built once at import. aiomysql has no server-side
+# prepare, so the nearest equivalent is a small fixed set of statement texts.
+_QUERY_LOGS_SQL = [_build_query_logs_sql(mask) for mask in range(1 << len(_QUERY_FILTERS))]
+_SEARCH_LOGS_SQL = [_build_search_logs_sql(mask) for mask in range(1 << len(_QUERY_FILTERS))]
+_SEARCH_TEMPLATES_SQL = [
+    _build_search_templates_sql(mask) for mask in range(1 << len(_TEMPLATE_FILTERS))
+]
+
+
+async def _stream_log_rows(rows):
+    """Yield log_events tuple rows as one JSON array, _STREAM_CHUNK_ROWS at a time.
+
+    Keeps peak memory to one encoded chunk instead of a model per row plus the
+    whole serialized body. meta_json is already valid JSON (MariaDB JSON columns
+    enforce JSON_VALID), so it is spliced in as an orjson.Fragment, not re-parsed.
+    """
+    yield b"["
+    for start in range(0, len(rows), _STREAM_CHUNK_ROWS):
+        events = []
+        for row in rows[start:start + _STREAM_CHUNK_ROWS]:
+            event = dict(zip(_QUERY_COLUMNS, row))
+            event["meta_json"] = orjson.Fragment(row[11]) if row[11] else None
+            events.append(event)
+        chunk = orjson.dumps(events)[1:-1]
+        yield b"," + chunk if start else chunk
+    yield b"]"
+
+
 @router.get(
     "/query/logs",
     response_model=List[LogEventResponse],
@@ -451,62 +790,20 @@ async def query_logs(
 
     try:
         async with pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                where_clauses = []
-                params: list = []
-
-                if service:
-                    where_clauses.append("service = %s")
-                    params.append(service)
-                if host:
-                    where_clauses.append("host = %s")
-                    params.append(host)
-                if level:
-                    where_clauses.append("level = %s")
-                    params.append(level.value)
-                if start_time:
-                    where_clauses.append("timestamp >= %s")
-                    params.append(start_time)
-                if end_time:
-                    where_clauses.append("timestamp <= %s")
-                    params.append(end_time)
-
-                where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-                query_sql = f"""
-                SELECT id, timestamp, source, service, host, level,
-                       trace_id, span_id, event_type, error_code,
-                       message, meta_json
-                FROM log_events
-                WHERE {where_sql}
-                ORDER BY timestamp DESC
-                LIMIT %s OFFSET %s
-                """
+            # Tuple cursor: no per-row dict; columns indexed in SELECT order
+            async with conn.cursor(aiomysql.Cursor) as cursor:
+                mask, params = _filter_params(
+                    (service, host, level and level.value, start_time, end_time))
                 params.extend([limit, offset])
 
-                await cursor.execute(query_sql, params)
+                await cursor.execute(_QUERY_LOGS_SQL[mask], params)
                 rows = await cursor.fetchall()
 
-                results = []
-                for row in rows:
-                    meta_json = json.loads(row['meta_json']) if row['meta_json'] else None
-                    results.append(LogEventResponse(
-                        id=row['id'],
-                        timestamp=row['timestamp'],
-                        source=row['source'],
-                        service=row['service'],
-                        host=row['host'],
-                        level=LogLevel(row['level']),
-                        trace_id=row['trace_id'],
-                        span_id=row['span_id'],
-                        event_type=row['event_type'],
-                        error_code=row['error_code'],
-                        message=row['message'],
-                        meta_json=meta_json,
-                    ))
-
-                logger.info("Query returned %d logs (service=%s, host=%s, level=%s)",
-                            len(results), service, host, level)
-                return results
+        logger.info("Query returned %d logs (service=%s, host=%s, level=%s)",
+                    len(rows), service, host, level)
+        # Encoded after the connection is back in the pool: rows come from our
+        # own table and were validated on ingest, so they skip Pydantic
+        return StreamingResponse(_stream_log_rows(rows), media_type="application/json")
 
     except DatabaseConnectionError:
         raise
@@ -515,6 +812,14 @@ async def query_logs(
         raise QueryError("Log query failed")
 
 
+async def _embed_query(request: Request, http_client, text: str):
+    """Embed search text, through the per-worker query cache when present."""
+    cache = getattr(request.app.state, "query_embedding_cache", None)
+    if cache is None:
+        return await embed_text(http_client, text)
+    return await embed_text_cached(http_client, text, cache)
+
+
 @router.get(
     "/search/logs",
     response_model=List[LogSearchResult],
@@ -535,7 +840,7 @@ async def search_logs(
     if http_client is None:
         raise QueryError("Embedding client not available")
 
-    query_embedding = await embed_text(http_client, query)
+    query_embedding = await _embed_query(request, http_client, query)
     if query_embedding is None:
         raise QueryError("Failed to generate query embedding")
 
@@ -549,63 +854,23 @@ async def search_logs(
     try:
         async with pool.acquire() as conn:
             async with conn.cursor() as cursor:
-                where_clauses = ["embedding_vector IS NOT NULL"]
-                params: list = []
-
-                if host:
-                    where_clauses.append("host = %s")
-                    params.append(host)
-                if service:
-                    where_clauses.append("service = %s")
-                    params.append(service)
-                if level:
-                    where_clauses.append("level = %s")
-                    params.append(level.value)
-                if start_time:
-                    where_clauses.append("timestamp >= %s")
-                    params.append(start_time)
-                if end_time:
-                    where_clauses.append("timestamp <= %s")
-                    params.append(end_time)
-
-                where_sql = " AND ".join(where_clauses)
-                search_sql = f"""
-                SELECT id, timestamp, source, service, host, level,
-                       trace_id, span_id, event_type, error_code,
-                       message, meta_json,
-                       VEC_DISTANCE_COSINE(embedding_vector, VEC_FromText(%s)) as distance
-                FROM log_events
-                WHERE {where_sql}
-                ORDER BY distance
-                LIMIT %s
-                """
-                params.append(query_blob)
-                params.append(limit)
-
-                await cursor.execute(search_sql, params)
+                mask, filter_params = _filter_params(
+                    (service, host, level and level.value, start_time, end_time))
+                # The vector placeholder sits in the SELECT list, ahead of WHERE
+                params = [query_blob, *filter_params, limit]
+
+                await cursor.execute(_SEARCH_LOGS_SQL[mask], params)
                 rows = await cursor.fetchall()
 
-                results = []
-                for row in rows:
-                    meta_json = json.loads(row['meta_json']) if row['meta_json'] else None
-                    results.append(LogSearchResult(
-                        id=row['id'],
-                        timestamp=row['timestamp'],
-                        source=row['source'],
-                        service=row['service'],
-                        host=row['host'],
-                        level=LogLevel(row['level']),
-                        trace_id=row['trace_id'],
-                        span_id=row['span_id'],
-                        event_type=row['event_type'],
-                        error_code=row['error_code'],
-                        message=row['message'],
-                        meta_json=meta_json,
-                        similarity_score=1.0 - float(row['distance']),
-                    ))
-
-                logger.info("Semantic search for '%s' returned %d results", query, len(results))
-                return results
+        # Encoded after the connection is back in the pool, the same way as
+        # query_logs: trusted rows skip Pydantic, and meta_json is spliced in
+        # as an orjson.Fragment instead of being parsed and re-serialized.
+        for row in rows:
+            row['meta_json'] = orjson.Fragment(row['meta_json']) if row['meta_json'] else None
+            row['similarity_score'] = 1.0 - float(row.pop('distance'))
+
+        logger.info("Semantic search for '%s' returned %d results", query, len(rows))
+        return Response(orjson.dumps(rows), media_type="application/json")
 
     except (DatabaseConnectionError, QueryError):
         raise
@@ -631,21 +896,23 @@ async def search_templates(
 
     Two-step search:
     1. Vector search on log_templates (small table with HNSW index)
-    2. Fetch recent raw examples from log_events for matched templates
+    2. Fetch recent raw examples from log_events for all matched templates
+       in one UNION ALL query
     """
     http_client = getattr(request.app.state, "http_client", None)
     if http_client is None:
         raise QueryError("Embedding client not available")
 
-    has_templates = await _check_templates_table_exists()
-    if not has_templates:
+    if not _schema_loaded:
+        await _load_schema_flags()
+    if not _has_templates_table:
         raise QueryError("log_templates table not available — run migration 003")
 
     # Canonicalize query text (no-op for natural language, helps for pasted log fragments)
     from services.canonicalize import canonicalize
     canon_query = canonicalize(query)
 
-    query_embedding = await embed_text(http_client, canon_query)
+    query_embedding = await _embed_query(request, http_client, canon_query)
     if query_embedding is None:
         raise QueryError("Failed to generate query embedding")
 
@@ -660,81 +927,52 @@ async def search_templates(
         async with pool.acquire() as conn:
             async with conn.cursor() as cursor:
                 # Step 1: Vector search on log_templates
-                where_clauses = []
-                params: list = []
-
-                if service:
-                    where_clauses.append("service = %s")
-                    params.append(service)
-                if level:
-                    where_clauses.append("level = %s")
-                    params.append(level.value)
-
-                where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-                search_sql = f"""
-                SELECT id, canonical_text, service, level, event_count,
-                       VEC_DISTANCE_COSINE(embedding_vector, VEC_FromText(%s)) as distance
-                FROM log_templates
-                WHERE {where_sql}
-                ORDER BY distance
-                LIMIT %s
-                """
-                params.append(query_blob)
-                params.append(limit)
-
-                await cursor.execute(search_sql, params)
+                mask, filter_params = _filter_params((service, level and level.value))
+                # The vector placeholder sits in the SELECT list, ahead of WHERE
+                params = [query_blob, *filter_params, limit]
+
+                await cursor.execute(_SEARCH_TEMPLATES_SQL[mask], params)
                 template_rows = await cursor.fetchall()
 
                 if not template_rows:
                     return []
 
-                # Step 2: Fetch recent raw examples for matched templates
-                template_ids = [row['id'] for row in template_rows]
-
-                results = []
-                for trow in template_rows:
-                    example_events = []
-                    if examples > 0:
-                        await cursor.execute("""
-                            SELECT id, timestamp, source, service, host, level,
-                                   trace_id, span_id, event_type, error_code,
-                                   message, meta_json
-                            FROM log_events
-                            WHERE template_id = %s
-                            ORDER BY timestamp DESC
-                            LIMIT %s
-                        """, (trow['id'], examples))
-                        event_rows = await cursor.fetchall()
-
-                        for erow in event_rows:
-                            meta_json = json.loads(erow['meta_json']) if erow['meta_json'] else None
-                            example_events.append(LogEventResponse(
-                                id=erow['id'],
-                                timestamp=erow['timestamp'],
-                                source=erow['source'],
-                                service=erow['service'],
-                                host=erow['host'],
-                                level=LogLevel(erow['level']),
-                                trace_id=erow['trace_id'],
-                                span_id=erow['span_id'],
-                                event_type=erow['event_type'],
-                                error_code=erow['error_code'],
-                                message=erow['message'],
-                                meta_json=meta_json,
-                            ))
-
-                    results.append(TemplateSearchResult(
-                        template_id=trow['id'],
-                        canonical_text=trow['canonical_text'],
-                        service=trow['service'],
-                        level=trow['level'],
-                        event_count=trow['event_count'],
-                        similarity_score=1.0 - float(trow['distance']),
-                        example_events=example_events,
-                    ))
-
-                logger.info("Template search for '%s' returned %d templates", query, len(results))
-                return results
+                # Step 2: Recent raw examples for every matched template in one
+                # round-trip: one index-limited UNION ALL branch per template
+                examples_by_template: dict[int, list] = {}
+                if examples > 0:
+                    example_params: list = []
+                    for trow in template_rows:
+                        example_params += (trow['id'], examples)
+                    await cursor.execute(
+                        " UNION ALL ".join([_TEMPLATE_EXAMPLES_BRANCH] * len(template_rows)),
+                        example_params,
+                    )
+                    for erow in await cursor.fetchall():
+                        examples_by_template.setdefault(erow['template_id'], []).append(erow)
+
+        # Encoded after the connection is back in the pool, like search_logs:
+        # trusted rows skip Pydantic and meta_json is spliced in as a Fragment
+        results = []
+        for trow in template_rows:
+            # UNION ALL doesn't preserve branch order; restore newest-first
+            event_rows = sorted(examples_by_template.get(trow['id'], ()),
+                                key=itemgetter('timestamp'), reverse=True)
+            for erow in event_rows:
+                del erow['template_id']
+                erow['meta_json'] = orjson.Fragment(erow['meta_json']) if erow['meta_json'] else None
+            results.append({
+                "template_id": trow['id'],
+                "canonical_text": trow['canonical_text'],
+                "service": trow['service'],
+                "level": trow['level'],
+                "event_count": trow['event_count'],
+                "similarity_score": 1.0 - float(trow['distance']),
+                "example_events": event_rows,
+            })
+
+        logger.info("Template search for '%s' returned %d templates", query, len(results))
+        return Response(orjson.dumps(results), media_type="application/json")
 
     except (DatabaseConnectionError, QueryError):
         raise
@@ -4,7 +4,10 @@ Handles MariaDB connections: async pool for API, sync for CLI scripts.
 """
 
 import os
+import time
 import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Optional
 
 import pymysql
@@ -19,6 +22,9 @@ logger = logging.getLogger(__name__)
 # Allowlist of tables that can be described (B3 - SQL injection prevention)
 _ALLOWED_TABLES = {"log_events", "log_templates"}
 
+# DESCRIBE statement per allowlisted table; only these strings ever execute
+_DESCRIBE_SQL = {table: f"DESCRIBE `{table}`" for table in _ALLOWED_TABLES}
+
 # ---------------------------------------------------------------------------
 # Environment helpers
 # ---------------------------------------------------------------------------
@@ -31,15 +37,47 @@ def _get_required_env(key: str, default: str = None) -> str:
     return value
 
 
-def _db_config() -> dict:
-    """Build DB config dict from environment."""
-    return {
-        'host': os.getenv('DB_HOST', 'localhost'),
-        'port': int(os.getenv('DB_PORT', 3306)),
-        'user': os.getenv('DB_USER', 'devmesh'),
-        'password': _get_required_env('DB_PASSWORD'),
-        'db': os.getenv('DB_NAME', 'devmesh'),
-    }
+@dataclass(frozen=True, slots=True)
+class DBConfig:
+    """Connection settings parsed from DB_* environment variables."""
+    host: str
+    port: int
+    user: str
+    password: str = field(repr=False)  # keep out of logs/tracebacks
+    db: str
+    pool_min_size: int
+    pool_max_size: int
+    pool_recycle: int
+    sync_driver: str
+    unix_socket: Optional[str]
+
+
+@lru_cache(maxsize=1)
+def _db_config() -> DBConfig:
+    """Build the DB config from environment once; immutable afterwards.
+
+    The env does not change after startup, so every connection and the pool
+    share one parsed config. Tests that patch DB_* call _reset_db_config_cache().
+    """
+    return DBConfig(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=int(os.getenv('DB_PORT', 3306)),
+        user=os.getenv('DB_USER', 'devmesh'),
+        password=_get_required_env('DB_PASSWORD'),
+        db=os.getenv('DB_NAME', 'devmesh'),
+        pool_min_size=int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        pool_max_size=int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        sync_driver=os.getenv('DB_SYNC_DRIVER', 'pymysql').lower(),
+        # Set when MariaDB runs on this host: skips TCP loopback and the
+        # TCP handshake on every new connection. host/port are then ignored.
+        unix_socket=os.getenv('DB_UNIX_SOCKET') or None,
+    )
+
+
+def _reset_db_config_cache() -> None:
+    """Drop the cached config so the next call re-reads the environment."""
+    _db_config.cache_clear()
 
 # ---------------------------------------------------------------------------
 # Async connection pool (H1, H2) - used by FastAPI routes
@@ -54,16 +92,22 @@ async def init_pool():
     import aiomysql
 
     cfg = _db_config()
+    # create_pool() opens minsize connections before returning, so the pool is
+    # already warm: the first requests after startup don't pay a handshake
     _pool = await aiomysql.create_pool(
-        host=cfg['host'],
-        port=cfg['port'],
-        user=cfg['user'],
-        password=cfg['password'],
-        db=cfg['db'],
+        host=cfg.host,
+        port=cfg.port,
+        user=cfg.user,
+        password=cfg.password,
+        db=cfg.db,
+        unix_socket=cfg.unix_socket,
         charset='utf8mb4',
         autocommit=False,
-        minsize=int(os.getenv('DB_POOL_MIN_SIZE', 2)),
-        maxsize=int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        minsize=cfg.pool_min_size,
+        maxsize=cfg.pool_max_size,
+        # Replace connections older than this on acquire, well inside the
+        # server's wait_timeout, so idle-overnight connections don't fail
+        pool_recycle=cfg.pool_recycle,
         cursorclass=aiomysql.DictCursor,
     )
     logger.info("Async DB pool initialised (min=%d, max=%d)", _pool.minsize, _pool.maxsize)
@@ -71,7 +115,8 @@ async def init_pool():
 
 async def close_pool():
     """Close the async pool. Call once at app shutdown."""
-    global _pool
+    global _pool, _health_ok_until
+    _health_ok_until = 0.0
     if _pool is not None:
         _pool.close()
         await _pool.wait_closed()
@@ -91,14 +136,45 @@ def get_pool():
 # ---------------------------------------------------------------------------
 
 def get_sync_connection():
-    """Create and return a new synchronous pymysql connection."""
+    """Create and return a new synchronous connection (DictCursor, autocommit off).
+
+    DB_SYNC_DRIVER=mysqlclient switches to MySQLdb, whose C protocol parser is
+    several times faster on the large result sets and INSERTs of migrations and
+    backfills. It needs libmariadb at build time, so pymysql stays the default.
+
+    There is deliberately no sync pool: every caller is a one-shot process
+    (migration, backfill, cron job) that opens one connection and holds it for
+    the whole run, so the handshake is paid once per job, not per query.
+    """
     cfg = _db_config()
+    if cfg.sync_driver == 'mysqlclient':
+        import MySQLdb
+        import MySQLdb.cursors
+
+        # MySQLdb rejects unix_socket=None, so only pass it when configured
+        socket_kwargs = {'unix_socket': cfg.unix_socket} if cfg.unix_socket else {}
+        return MySQLdb.connect(
+            host=cfg.host,
+            port=cfg.port,
+            user=cfg.user,
+            passwd=cfg.password,
+            db=cfg.db,
+            charset='utf8mb4',
+            cursorclass=MySQLdb.cursors.DictCursor,
+            autocommit=False,
+            **socket_kwargs,
+        )
+    if cfg.sync_driver != 'pymysql':
+        raise RuntimeError(
+            f"DB_SYNC_DRIVER must be 'pymysql' or 'mysqlclient', got {cfg.sync_driver!r}"
+        )
     return pymysql.connect(
-        host=cfg['host'],
-        port=cfg['port'],
-        user=cfg['user'],
-        password=cfg['password'],
-        database=cfg['db'],
+        host=cfg.host,
+        port=cfg.port,
+        user=cfg.user,
+        password=cfg.password,
+        database=cfg.db,
+        unix_socket=cfg.unix_socket,
         charset='utf8mb4',
         cursorclass=DictCursor,
         autocommit=False,
@@ -167,16 +243,27 @@ def test_connection() -> bool:
         return False
 
 
+# A successful async probe is trusted for this long, so frequent /health
+# polling doesn't take a pool connection each time. Failures are never cached.
+_HEALTH_OK_TTL_SECONDS = 5.0
+_health_ok_until = 0.0
+
+
 async def async_test_connection() -> bool:
-    """Test database connection via the async pool."""
+    """Test database connection via the async pool (success cached briefly)."""
+    global _health_ok_until
+    if _pool is not None and time.monotonic() < _health_ok_until:
+        return True
     try:
         pool = get_pool()
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute("SELECT 1")
                 await cur.fetchone()
+        _health_ok_until = time.monotonic() + _HEALTH_OK_TTL_SECONDS
         return True
     except Exception:
+        _health_ok_until = 0.0
         return False
 
 
@@ -188,7 +275,7 @@ def get_table_info(table_name: str = 'log_events'):
     conn = get_sync_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("DESCRIBE `log_events`" if table_name == "log_events" else f"DESCRIBE `{table_name}`")
+            cursor.execute(_DESCRIBE_SQL[table_name])
             columns = cursor.fetchall()
             print(f"\n{table_name} schema:")
             print("-" * 80)
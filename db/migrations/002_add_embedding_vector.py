@@ -15,10 +15,17 @@ Rollback: python db/migrations/002_add_embedding_vector.py --rollback
 
 import os
 import sys
+import threading
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from db.database import get_connection
 
+# Seconds between progress lines while a long DDL statement runs
+PROGRESS_INTERVAL = 10
+
+# ALTER options MariaDB rejects when it can't do the change online
+_ONLINE_UNSUPPORTED = (1845, 1846)
+
 
 def migrate():
     """Add embedding_vector column (nullable, no index yet)."""
@@ -59,21 +66,65 @@ def migrate():
         conn.close()
 
 
+def _run_with_progress(conn, sql: str, label: str):
+    """Run a long DDL statement on conn, printing MariaDB's progress every 10s.
+
+    The statement runs in a worker thread while a second connection polls
+    information_schema.PROCESSLIST (STAGE/MAX_STAGE/PROGRESS) for the first
+    connection's thread id. Re-raises the statement's error, if any.
+    """
+    thread_id = conn.thread_id()
+    errors = []
+
+    def run():
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+        except Exception as e:
+            errors.append(e)
+
+    monitor = get_connection()
+    worker = threading.Thread(target=run)
+    worker.start()
+    try:
+        while True:
+            worker.join(PROGRESS_INTERVAL)
+            if not worker.is_alive():
+                break
+            with monitor.cursor() as cursor:
+                cursor.execute("""
+                    SELECT STAGE, MAX_STAGE, PROGRESS
+                    FROM information_schema.PROCESSLIST
+                    WHERE ID = %s
+                """, (thread_id,))
+                row = cursor.fetchone()
+            if row:
+                print(f"  {label}: stage {row['STAGE']}/{row['MAX_STAGE']}, "
+                      f"{row['PROGRESS']:.1f}%")
+    finally:
+        monitor.close()
+
+    if errors:
+        raise errors[0]
+
+
 def create_index():
     """Create HNSW vector index (requires NOT NULL, so set column NOT NULL first).
 
     This should be run after backfill has populated all rows, or after setting
-    NULL rows to a zero vector.
+    NULL rows to a zero vector. The NOT NULL change runs online where MariaDB
+    allows it, so ingest keeps writing; the index build reports progress.
     """
     conn = get_connection()
 
     try:
         with conn.cursor() as cursor:
-            # Check how many NULLs remain
-            cursor.execute("SELECT COUNT(*) as cnt FROM log_events WHERE embedding_vector IS NULL")
-            nulls = cursor.fetchone()['cnt']
-            if nulls > 0:
-                print(f"Warning: {nulls} rows still have NULL embedding_vector")
+            # Stop at the first NULL instead of counting them all
+            cursor.execute("""
+                SELECT EXISTS(SELECT 1 FROM log_events WHERE embedding_vector IS NULL) AS has_nulls
+            """)
+            if cursor.fetchone()['has_nulls']:
+                print("Warning: rows still have NULL embedding_vector")
                 print("The column will be set to NOT NULL — NULLs will block this.")
                 print("Run backfill first, or pass --force to set NULLs to zero vector.")
                 return False
@@ -84,20 +135,30 @@ def create_index():
                 print("Index 'idx_embedding' already exists, skipping...")
                 return True
 
-            print("Setting embedding_vector to NOT NULL...")
-            cursor.execute("""
-                ALTER TABLE log_events
-                MODIFY COLUMN embedding_vector VECTOR(4096) NOT NULL
-            """)
-
-            print("Creating HNSW vector index...")
-            cursor.execute("""
-                CREATE VECTOR INDEX idx_embedding ON log_events (embedding_vector)
-            """)
-
-            conn.commit()
-            print("Vector index created successfully")
-            return True
+        print("Setting embedding_vector to NOT NULL (online)...")
+        modify_sql = """
+            ALTER TABLE log_events
+            MODIFY COLUMN embedding_vector VECTOR(4096) NOT NULL
+        """
+        try:
+            _run_with_progress(conn, modify_sql + ", ALGORITHM=INPLACE, LOCK=NONE", "NOT NULL")
+        except Exception as e:
+            if not e.args or e.args[0] not in _ONLINE_UNSUPPORTED:
+                raise
+            print(f"Online ALTER not supported ({e.args[-1]}), falling back to a locking ALTER...")
+            _run_with_progress(conn, modify_sql, "NOT NULL")
+
+        # DISTANCE=cosine: search orders by VEC_DISTANCE_COSINE, and the
+        # index is only used when its metric matches (default: euclidean)
+        print("Creating HNSW vector index...")
+        _run_with_progress(conn, """
+            CREATE VECTOR INDEX idx_embedding ON log_events (embedding_vector)
+            DISTANCE=cosine
+        """, "idx_embedding")
+
+        conn.commit()
+        print("Vector index created successfully")
+        return True
 
     except Exception as e:
         conn.rollback()
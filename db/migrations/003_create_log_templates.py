@@ -22,16 +22,29 @@ def migrate():
 
     try:
         with conn.cursor() as cursor:
-            # Check if log_templates table already exists
+            # Probe both the table and the column in one round-trip; each branch
+            # keys on table_name equality so MariaDB takes its I_S lookup path
             cursor.execute("""
-                SELECT COUNT(*) as cnt
+                SELECT 'table' AS found
                 FROM information_schema.tables
                 WHERE table_schema = DATABASE()
                   AND table_name = 'log_templates'
+                UNION ALL
+                SELECT 'column'
+                FROM information_schema.columns
+                WHERE table_schema = DATABASE()
+                  AND table_name = 'log_events'
+                  AND column_name = 'template_id'
             """)
-            if cursor.fetchone()['cnt'] > 0:
+            found = {row['found'] for row in cursor.fetchall()}
+
+            if 'table' in found:
                 print("Table 'log_templates' already exists, skipping creation...")
             else:
+                # HNSW vector index declared inline: embedding_vector is NOT NULL
+                # from creation, so the table and index arrive in one DDL.
+                # DISTANCE=cosine to match the VEC_DISTANCE_COSINE search
+                # (default metric is euclidean)
                 print("Creating 'log_templates' table...")
                 cursor.execute("""
                     CREATE TABLE log_templates (
@@ -55,38 +68,24 @@ def migrate():
                         UNIQUE INDEX idx_template_hash (template_hash),
                         INDEX idx_canon_version (canon_version),
                         INDEX idx_service (service),
-                        INDEX idx_last_seen (last_seen)
+                        INDEX idx_last_seen (last_seen),
+                        VECTOR INDEX idx_template_embedding (embedding_vector) DISTANCE=cosine
                     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
                 """)
-                print("Table 'log_templates' created")
-
-                # HNSW vector index — embedding_vector is NOT NULL from creation,
-                # so index works immediately
-                print("Creating HNSW vector index on log_templates...")
-                cursor.execute("""
-                    CREATE VECTOR INDEX idx_template_embedding
-                    ON log_templates (embedding_vector)
-                """)
-                print("Vector index created")
+                print("Table 'log_templates' created with HNSW vector index")
 
             # Add template_id to log_events if not present
-            cursor.execute("""
-                SELECT COUNT(*) as cnt
-                FROM information_schema.columns
-                WHERE table_schema = DATABASE()
-                  AND table_name = 'log_events'
-                  AND column_name = 'template_id'
-            """)
-            if cursor.fetchone()['cnt'] > 0:
+            if 'column' in found:
                 print("Column 'template_id' already exists on log_events, skipping...")
             else:
+                # One ALTER so InnoDB builds the index in the same pass as the
+                # column add; LOCK=NONE keeps ingest writing meanwhile
                 print("Adding 'template_id' column to log_events...")
                 cursor.execute("""
                     ALTER TABLE log_events
-                    ADD COLUMN template_id BIGINT DEFAULT NULL
-                """)
-                cursor.execute("""
-                    CREATE INDEX idx_template_id ON log_events (template_id)
+                    ADD COLUMN template_id BIGINT DEFAULT NULL,
+                    ADD INDEX idx_template_id (template_id),
+                    LOCK=NONE
                 """)
                 print("Column 'template_id' added with index")
 
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Migration 004: Add DB-computed event_hash for deduplication
+
+Adds a persistent generated column hashing the same fields as log_hash
+(timestamp | host | service | message) and a unique index on it, so MariaDB
+rejects duplicates on INSERT IGNORE without the API hashing every row.
+
+Once the column and its unique index exist the ingest path stops computing
+log_hash. The old column is left in place (NULL for new rows) and can be
+dropped later.
+
+Adding the PERSISTENT column copies the whole table under a write lock, so
+run it in a maintenance window. The migration refuses to start while exact
+duplicates exist, since they would fail the unique index after the copy.
+
+Run:      python db/migrations/004_add_event_hash.py
+Rollback: python db/migrations/004_add_event_hash.py --rollback
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from db.database import get_connection
+
+
+def migrate():
+    """Add event_hash generated column and unique index.
+
+    Aborts before any DDL if log_events already holds exact duplicates, and
+    drops the column again if the index cannot be built: DDL commits
+    implicitly, and a column without its unique index would switch ingest
+    off log_hash while deduplicating nothing.
+    """
+    conn = get_connection()
+
+    try:
+        with conn.cursor() as cursor:
+            # Probe the column and the index in one round-trip; each branch
+            # keys on table_name equality so MariaDB takes its I_S lookup path
+            cursor.execute("""
+                SELECT 'column' AS found
+                FROM information_schema.columns
+                WHERE table_schema = DATABASE()
+                  AND table_name = 'log_events'
+                  AND column_name = 'event_hash'
+                UNION ALL
+                SELECT 'index'
+                FROM information_schema.statistics
+                WHERE table_schema = DATABASE()
+                  AND table_name = 'log_events'
+                  AND index_name = 'idx_event_hash'
+            """)
+            found = {row['found'] for row in cursor.fetchall()}
+
+            if 'index' in found:
+                print("Index 'idx_event_hash' already exists, skipping...")
+                return True
+
+            # Full scan, but far cheaper than a table copy that ends in 1062
+            print("Checking log_events for duplicate events...")
+            cursor.execute("""
+                SELECT 1
+                FROM log_events
+                GROUP BY timestamp, host, service, message
+                HAVING COUNT(*) > 1
+                LIMIT 1
+            """)
+            if cursor.fetchone():
+                print("✗ log_events holds duplicate (timestamp, host, service, message) rows; "
+                      "delete them before running this migration")
+                return False
+
+            if 'column' in found:
+                print("Column 'event_hash' already exists, adding missing index...")
+            else:
+                # Adding a PERSISTENT generated column rebuilds the table with
+                # ALGORITHM=COPY, blocking writes for the whole copy; unlike
+                # migrations 002/003 this DDL cannot run online, so schedule it
+                # in a maintenance window (the shipper spools meanwhile)
+                print("Adding 'event_hash' generated column (table copy, writes blocked)...")
+                cursor.execute("""
+                    ALTER TABLE log_events
+                    ADD COLUMN event_hash BINARY(16)
+                        AS (UNHEX(MD5(CONCAT_WS('|', timestamp, host, service, message)))) PERSISTENT
+                        COMMENT 'DB-computed dedup hash (MD5 of timestamp|host|service|message)'
+                """)
+
+            print("Creating unique index on event_hash...")
+            try:
+                cursor.execute("""
+                    CREATE UNIQUE INDEX idx_event_hash ON log_events (event_hash)
+                """)
+            except Exception:
+                print("Index creation failed, dropping 'event_hash' column...")
+                cursor.execute("ALTER TABLE log_events DROP COLUMN IF EXISTS event_hash")
+                raise
+
+            conn.commit()
+            print("✓ Migration complete: event_hash column and index added")
+            return True
+
+    except Exception as e:
+        conn.rollback()
+        print(f"✗ Migration failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def rollback():
+    """Remove event_hash column and index."""
+    conn = get_connection()
+
+    try:
+        with conn.cursor() as cursor:
+            print("Dropping index...")
+            cursor.execute("DROP INDEX IF EXISTS idx_event_hash ON log_events")
+
+            print("Dropping column...")
+            cursor.execute("ALTER TABLE log_events DROP COLUMN IF EXISTS event_hash")
+
+            conn.commit()
+            print("✓ Rollback complete")
+            return True
+
+    except Exception as e:
+        conn.rollback()
+        print(f"✗ Rollback failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Add DB-computed event_hash for deduplication')
+    parser.add_argument('--rollback', action='store_true', help='Rollback the migration')
+    args = parser.parse_args()
+
+    if args.rollback:
+        rollback()
+    else:
+        migrate()
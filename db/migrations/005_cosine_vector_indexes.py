@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Migration 005: Rebuild HNSW vector indexes with DISTANCE=cosine
+
+Migrations 002 and 003 created their vector indexes without a DISTANCE
+option, so MariaDB built them for its default euclidean metric. Search orders
+by VEC_DISTANCE_COSINE, and MariaDB only uses a vector index whose metric
+matches the ORDER BY function — every semantic search was a full scan.
+
+Each index that exists is dropped and recreated as DISTANCE=cosine; indexes
+that are missing (e.g. idx_embedding before the 002 backfill) are skipped.
+
+Run:      python db/migrations/005_cosine_vector_indexes.py
+Rollback: python db/migrations/005_cosine_vector_indexes.py --rollback
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from db.database import get_connection
+
+# (table, index name) for every HNSW index on an embedding_vector column
+VECTOR_INDEXES = [
+    ("log_templates", "idx_template_embedding"),
+    ("log_events", "idx_embedding"),
+]
+
+
+def _index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index,))
+    return cursor.fetchone() is not None
+
+
+def _uses_cosine(cursor, table: str) -> bool:
+    cursor.execute(f"SHOW CREATE TABLE {table}")
+    create_sql = cursor.fetchone()['Create Table']
+    return "DISTANCE`=cosine" in create_sql or "DISTANCE=cosine" in create_sql
+
+
+def _rebuild(distance_clause: str) -> bool:
+    conn = get_connection()
+
+    try:
+        with conn.cursor() as cursor:
+            # Which tables exist, in one round-trip (one equality branch per table)
+            tables = [table for table, _ in VECTOR_INDEXES]
+            cursor.execute(" UNION ALL ".join(
+                ["SELECT table_name AS name FROM information_schema.tables"
+                 " WHERE table_schema = DATABASE() AND table_name = %s"] * len(tables)
+            ), tables)
+            existing = {row['name'] for row in cursor.fetchall()}
+
+            for table, index in VECTOR_INDEXES:
+                if table not in existing or not _index_exists(cursor, table, index):
+                    print(f"Index '{index}' not present on {table}, skipping...")
+                    continue
+                if _uses_cosine(cursor, table) == bool(distance_clause):
+                    print(f"Index '{index}' already has the target metric, skipping...")
+                    continue
+
+                print(f"Rebuilding '{index}' on {table}{' with ' + distance_clause if distance_clause else ''}...")
+                cursor.execute(f"DROP INDEX {index} ON {table}")
+                cursor.execute(
+                    f"CREATE VECTOR INDEX {index} ON {table} (embedding_vector) {distance_clause}"
+                )
+                print(f"Index '{index}' rebuilt")
+
+            conn.commit()
+            return True
+
+    except Exception as e:
+        conn.rollback()
+        print(f"✗ Migration failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def migrate():
+    """Recreate existing vector indexes as DISTANCE=cosine."""
+    if _rebuild("DISTANCE=cosine"):
+        print("✓ Migration complete: vector indexes use cosine distance")
+        return True
+    return False
+
+
+def rollback():
+    """Recreate existing vector indexes with the default (euclidean) metric."""
+    if _rebuild(""):
+        print("✓ Rollback complete")
+        return True
+    return False
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Rebuild HNSW vector indexes with DISTANCE=cosine')
+    parser.add_argument('--rollback', action='store_true', help='Rollback the migration')
+    args = parser.parse_args()
+
+    if args.rollback:
+        rollback()
+    else:
+        migrate()
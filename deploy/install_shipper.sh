@@ -120,7 +120,7 @@ python3 -m venv "$INSTALL_DIR/venv"
 # Install dependencies
 log_info "Installing Python dependencies..."
 "$INSTALL_DIR/venv/bin/pip" install --quiet --upgrade pip
-"$INSTALL_DIR/venv/bin/pip" install --quiet requests python-dotenv pyyaml
+"$INSTALL_DIR/venv/bin/pip" install --quiet requests python-dotenv pyyaml orjson
 
 # Create systemd service (H4 - runs as devmesh, not root)
 log_info "Installing systemd service..."
@@ -8,12 +8,14 @@ Usage:
     python ttl_cleanup.py --days 30          # Custom retention
     python ttl_cleanup.py --dry-run          # Preview without deleting
     python ttl_cleanup.py --batch-size 10000 # Custom batch size
+    python ttl_cleanup.py --throttle-ms 200  # Pause between batches for ingest
 """
 
-import os
 import sys
+import time
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -36,6 +38,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# MariaDB error code for a missing table; same args[0] under pymysql and MySQLdb
+ER_NO_SUCH_TABLE = 1146
+
 
 def get_db_connection():
     """Create database connection using shared helper (M3)."""
@@ -44,37 +49,30 @@ def get_db_connection():
 
 
 def get_stats(cursor, cutoff_date):
-    """Get statistics about logs to be deleted."""
-    cursor.execute("""
-        SELECT
-            COUNT(*) as total_logs,
-            MIN(timestamp) as oldest_log,
-            MAX(timestamp) as newest_log
-        FROM log_events
-    """)
-    total = cursor.fetchone()
-
-    cursor.execute("""
-        SELECT COUNT(*) as to_delete
-        FROM log_events
-        WHERE timestamp < %s
-    """, (cutoff_date,))
-    to_delete = cursor.fetchone()
+    """Get statistics about logs to be deleted, in one round-trip.
 
+    Every value is answered from an index or the data dictionary: MIN/MAX read
+    the ends of idx_timestamp, the cutoff count is a range scan on it, and the
+    total is InnoDB's TABLE_ROWS estimate (logging only, not worth a full scan).
+    """
     cursor.execute("""
         SELECT
+            (SELECT MIN(timestamp) FROM log_events) as oldest_log,
+            (SELECT MAX(timestamp) FROM log_events) as newest_log,
+            (SELECT COUNT(*) FROM log_events WHERE timestamp < %s) as to_delete,
+            TABLE_ROWS as approx_rows,
             ROUND((data_length + index_length) / 1024 / 1024, 2) as size_mb
         FROM information_schema.tables
-        WHERE table_schema = %s AND table_name = 'log_events'
-    """, (os.getenv('DB_NAME', 'devmesh'),))
-    size = cursor.fetchone()
+        WHERE table_schema = DATABASE() AND table_name = 'log_events'
+    """, (cutoff_date,))
+    stats = cursor.fetchone()
 
     return {
-        'total_logs': total['total_logs'],
-        'oldest_log': total['oldest_log'],
-        'newest_log': total['newest_log'],
-        'to_delete': to_delete['to_delete'],
-        'table_size_mb': size['size_mb'] if size else 0,
+        'total_logs': stats['approx_rows'] or 0,
+        'oldest_log': stats['oldest_log'],
+        'newest_log': stats['newest_log'],
+        'to_delete': stats['to_delete'],
+        'table_size_mb': stats['size_mb'] or 0,
     }
 
 
@@ -84,20 +82,18 @@ def delete_stale_templates(cursor, conn, cutoff_date, dry_run=False):
     Templates are considered stale if their last_seen timestamp is older
     than the cutoff. This keeps template growth bounded as log_events expire.
     """
-    # Check if log_templates table exists
-    cursor.execute("""
-        SELECT COUNT(*) as cnt FROM information_schema.tables
-        WHERE table_schema = %s AND table_name = 'log_templates'
-    """, (os.getenv('DB_NAME', 'devmesh'),))
-    if cursor.fetchone()['cnt'] == 0:
-        logger.info("Template cleanup: log_templates table not found, skipping")
-        return {'deleted': 0}
-
-    # Count stale templates
-    cursor.execute("""
-        SELECT COUNT(*) as cnt FROM log_templates
-        WHERE last_seen < %s
-    """, (cutoff_date,))
+    # Count stale templates. A missing table (before migration 003) shows up
+    # as ER_NO_SUCH_TABLE here, so no separate information_schema probe
+    try:
+        cursor.execute("""
+            SELECT COUNT(*) as cnt FROM log_templates
+            WHERE last_seen < %s
+        """, (cutoff_date,))
+    except Exception as e:
+        if e.args and e.args[0] == ER_NO_SUCH_TABLE:
+            logger.info("Template cleanup: log_templates table not found, skipping")
+            return {'deleted': 0}
+        raise
     stale_count = cursor.fetchone()['cnt']
 
     if stale_count == 0:
@@ -124,7 +120,24 @@ def delete_stale_templates(cursor, conn, cutoff_date, dry_run=False):
     return {'deleted': deleted}
 
 
-def delete_old_logs(retention_days=90, batch_size=5000, dry_run=False):
+def _delete_stale_templates_own_connection(cutoff_date, dry_run=False):
+    """delete_stale_templates() on a dedicated connection, for running in a thread.
+
+    log_templates shares no rows or locks with log_events, so it can be cleaned
+    while the log_events batches run; each table commits independently.
+    """
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            return delete_stale_templates(cursor, conn, cutoff_date, dry_run)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def delete_old_logs(retention_days=90, batch_size=5000, dry_run=False, throttle_ms=50):
     """Delete logs older than retention_days using batched deletes."""
     cutoff_date = datetime.now() - timedelta(days=retention_days)
 
@@ -132,15 +145,17 @@ def delete_old_logs(retention_days=90, batch_size=5000, dry_run=False):
     logger.info("  Retention: %d days", retention_days)
     logger.info("  Cutoff date: %s", cutoff_date.strftime('%Y-%m-%d %H:%M:%S'))
     logger.info("  Batch size: %d", batch_size)
+    logger.info("  Throttle: %d ms", throttle_ms)
     logger.info("  Dry run: %s", dry_run)
 
     conn = get_db_connection()
     cursor = conn.cursor()
+    template_executor = ThreadPoolExecutor(max_workers=1)
 
     try:
         stats_before = get_stats(cursor, cutoff_date)
         logger.info("Current state:")
-        logger.info("  Total logs: %s", f"{stats_before['total_logs']:,}")
+        logger.info("  Total logs (approx): %s", f"{stats_before['total_logs']:,}")
         logger.info("  Oldest log: %s", stats_before['oldest_log'])
         logger.info("  Newest log: %s", stats_before['newest_log'])
         logger.info("  Table size: %s MB", stats_before['table_size_mb'])
@@ -164,41 +179,78 @@ def delete_old_logs(retention_days=90, batch_size=5000, dry_run=False):
                 'templates_would_delete': template_result.get('would_delete', 0),
             }
 
+        # Stale templates (same retention period) are cleaned concurrently
+        template_job = template_executor.submit(
+            _delete_stale_templates_own_connection, cutoff_date, dry_run)
+
         total_deleted = 0
         batch_num = 0
         logger.info("Starting deletion...")
 
+        # Each batch reads ids off idx_timestamp (index-only: InnoDB secondary
+        # entries carry the PK), then deletes by PRIMARY KEY. DELETE ... WHERE
+        # timestamp < x LIMIT n would take next-key locks across the scanned
+        # timestamp range and block concurrent ingest. batch_start resumes the
+        # scan where the last batch ended instead of re-walking purged entries;
+        # the first probe and a final sweep run unbounded (batch_start None) so
+        # late rows older than the cursor, e.g. spool replays, are not missed.
+        batch_start = None
         while True:
-            batch_num += 1
-            cursor.execute("""
-                DELETE FROM log_events
-                WHERE timestamp < %s
-                LIMIT %s
-            """, (cutoff_date, batch_size))
+            if batch_start is None:
+                cursor.execute("""
+                    SELECT id, timestamp
+                    FROM log_events
+                    WHERE timestamp < %s
+                    ORDER BY timestamp
+                    LIMIT %s
+                """, (cutoff_date, batch_size))
+            else:
+                cursor.execute("""
+                    SELECT id, timestamp
+                    FROM log_events
+                    WHERE timestamp >= %s AND timestamp < %s
+                    ORDER BY timestamp
+                    LIMIT %s
+                """, (batch_start, cutoff_date, batch_size))
+            batch = cursor.fetchall()
+
+            if not batch:
+                if batch_start is None:
+                    break
+                batch_start = None
+                continue
 
+            batch_num += 1
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f"DELETE FROM log_events WHERE id IN ({placeholders})",
+                [row['id'] for row in batch],
+            )
             deleted_count = cursor.rowcount
             conn.commit()
-
-            if deleted_count == 0:
-                break
+            batch_start = batch[-1]['timestamp']
 
             total_deleted += deleted_count
             logger.info("  Batch %d: deleted %s logs (total: %s)",
                         batch_num, f"{deleted_count:,}", f"{total_deleted:,}")
 
+            # Yield to ingest between batches; a short final batch means the
+            # range is nearly done, so scale the pause by how full it was
+            if throttle_ms > 0:
+                time.sleep(throttle_ms / 1000.0 * len(batch) / batch_size)
+
         stats_after = get_stats(cursor, cutoff_date)
         logger.info("Cleanup complete:")
         logger.info("  Total deleted: %s logs", f"{total_deleted:,}")
         logger.info("  Batches: %d", batch_num)
-        logger.info("  Remaining logs: %s", f"{stats_after['total_logs']:,}")
+        logger.info("  Remaining logs (approx): %s", f"{stats_after['total_logs']:,}")
         logger.info("  New oldest log: %s", stats_after['oldest_log'])
         logger.info("  Table size: %s MB", stats_after['table_size_mb'])
 
         if total_deleted > 0:
             logger.info("Note: Run 'OPTIMIZE TABLE log_events' to reclaim disk space")
 
-        # Clean up stale templates (same retention period)
-        template_result = delete_stale_templates(cursor, conn, cutoff_date, dry_run)
+        template_result = template_job.result()
 
         return {
             'deleted': total_deleted,
@@ -212,6 +264,8 @@ def delete_old_logs(retention_days=90, batch_size=5000, dry_run=False):
         logger.error("Error during cleanup: %s", e)
         raise
     finally:
+        # Waits for a running template cleanup so its connection is closed
+        template_executor.shutdown(wait=True)
         cursor.close()
         conn.close()
 
@@ -224,6 +278,8 @@ def main():
                         help='Retention period in days (default: 90)')
     parser.add_argument('--batch-size', '-b', type=int, default=5000,
                         help='Number of rows to delete per batch (default: 5000)')
+    parser.add_argument('--throttle-ms', type=int, default=50,
+                        help='Pause after each full batch so ingest is not starved (default: 50)')
     parser.add_argument('--dry-run', '-n', action='store_true',
                         help='Preview what would be deleted without actually deleting')
 
@@ -234,6 +290,7 @@ def main():
             retention_days=args.days,
             batch_size=args.batch_size,
             dry_run=args.dry_run,
+            throttle_ms=args.throttle_ms,
         )
 
         if args.dry_run:
@@ -4,19 +4,22 @@ AI-Native Observability for Local Infrastructure
 """
 
 import os
-import json
+import time
 import logging
+from itertools import count
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 
 import httpx
+import orjson
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
+from pymysql.constants import ER
 
 from models.schemas import HealthResponse, InfoResponse, ErrorResponse
-from db.database import init_pool, close_pool, async_test_connection, test_connection
-from api.routes import router as api_router
+from db.database import init_pool, close_pool, async_test_connection
+from api.routes import router as api_router, warm_schema_cache
 from api.auth import APIKeyMiddleware
 from errors import DevMeshError
 
@@ -37,7 +40,7 @@ class _JSONFormatter(logging.Formatter):
         }
         if record.exc_info and record.exc_info[0]:
             log_obj["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_obj)
+        return orjson.dumps(log_obj).decode()
 
 
 handler = logging.StreamHandler()
@@ -60,11 +63,21 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error("Failed to initialise DB pool: %s", e)
 
+    # Resolve schema flags before serving requests; raises ConfigurationError
+    # (aborting startup) when the database has no log_events table
+    await warm_schema_cache()
+
     # Create shared httpx client for embedding service
     embedding_timeout = int(os.getenv('EMBEDDING_TIMEOUT', '120'))
     app.state.http_client = httpx.AsyncClient(timeout=embedding_timeout)
     logger.info("HTTP client initialised (timeout=%ds)", embedding_timeout)
 
+    # Per-worker caches so repeated messages and search queries skip the
+    # embedding gateway
+    from services.embedding import EmbeddingCache, QUERY_EMBEDDING_CACHE_SIZE
+    app.state.embedding_cache = EmbeddingCache()
+    app.state.query_embedding_cache = EmbeddingCache(max_size=QUERY_EMBEDDING_CACHE_SIZE)
+
     # Warm template cache from DB
     from services.template_cache import TemplateCache
     app.state.template_cache = TemplateCache()
@@ -73,21 +86,15 @@ async def lifespan(app: FastAPI):
         pool = _get_pool()
         async with pool.acquire() as conn:
             async with conn.cursor() as cursor:
-                await cursor.execute("""
-                    SELECT COUNT(*) as cnt
-                    FROM information_schema.tables
-                    WHERE table_schema = DATABASE()
-                      AND table_name = 'log_templates'
-                """)
-                row = await cursor.fetchone()
-                if row['cnt'] > 0:
-                    await cursor.execute("SELECT template_hash, id FROM log_templates")
-                    rows = await cursor.fetchall()
-                    app.state.template_cache.warm(rows)
-                else:
-                    logger.info("log_templates table not found, template cache empty")
+                # One round-trip: a missing table (before migration 003)
+                # surfaces as ER_NO_SUCH_TABLE instead of a separate probe
+                await cursor.execute("SELECT template_hash, id FROM log_templates")
+                app.state.template_cache.warm(await cursor.fetchall())
     except Exception as e:
-        logger.warning("Failed to warm template cache: %s", e)
+        if e.args and e.args[0] == ER.NO_SUCH_TABLE:
+            logger.info("log_templates table not found, template cache empty")
+        else:
+            logger.warning("Failed to warm template cache: %s", e)
 
     logger.info("API running on http://%s:%s",
                 os.getenv('API_HOST', '0.0.0.0'), os.getenv('API_PORT', 8000))
@@ -149,12 +156,25 @@ async def unexpected_error_handler(request: Request, exc: Exception):
     )
 
 
-# Request logging middleware
+# Monitoring polls these constantly; only 1 in _PROBE_LOG_EVERY successful
+# hits is logged, so probes don't flood the logs (which are shipped back
+# into log_events)
+_PROBE_PATHS = frozenset(("/health", "/info"))
+_PROBE_LOG_EVERY = 100
+_probe_hits = count()
+
+
+# Request logging middleware: one line per request, with latency
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info("-> %s %s", request.method, request.url.path)
+    start = time.perf_counter()
     response = await call_next(request)
-    logger.info("<- %s %s %d", request.method, request.url.path, response.status_code)
+    path = request.url.path
+    if (path in _PROBE_PATHS and response.status_code < 400
+            and next(_probe_hits) % _PROBE_LOG_EVERY):
+        return response
+    logger.info("%s %s %d %.1fms", request.method, path, response.status_code,
+                (time.perf_counter() - start) * 1000)
     return response
 
 
@@ -213,4 +233,7 @@ if __name__ == "__main__":
         port=int(os.getenv('API_PORT', 8000)),
         reload=os.getenv('DEV_MODE', 'false').lower() in ('true', '1', 'yes'),  # H5
         log_level="info",
+        # uvloop ships with uvicorn[standard]; naming it fails loudly if it is
+        # missing instead of the "auto" fallback to the slower asyncio loop
+        loop=os.getenv('API_LOOP', 'uvloop'),
     )
@@ -3,7 +3,9 @@
 Backfill embeddings for existing log_events rows that have NULL embedding_vector.
 
 Queries rows in batches, calls the LLM gateway batch endpoint for embeddings,
-and updates each row. Can be stopped and resumed safely (queries by NULL).
+and writes each batch back with one joined UPDATE. The next batch is embedded
+while the current one is written, so DB time hides behind gateway time. Can be
+stopped and resumed safely (queries by NULL).
 
 Usage:
     python scripts/backfill_embeddings.py --batch-size 50
@@ -13,8 +15,10 @@ import os
 import sys
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 import httpx
+import orjson
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -29,7 +33,7 @@ EMBEDDING_TIMEOUT = int(os.getenv("EMBEDDING_TIMEOUT", "120"))
 
 
 def _vec_to_text(vec: list[float]) -> str:
-    return "[" + ",".join(str(f) for f in vec) + "]"
+    return orjson.dumps(vec).decode()
 
 
 def embed_batch_sync(client: httpx.Client, texts: list[str]) -> list[list[float] | None]:
@@ -49,9 +53,52 @@ def embed_batch_sync(client: httpx.Client, texts: list[str]) -> list[list[float]
         return [None] * len(texts)
 
 
+# Rows per joined UPDATE: each carries ~40KB of vector text, so 100 rows stays
+# well under MariaDB's max_allowed_packet
+UPDATE_CHUNK = 100
+
+
+def update_embeddings(conn, updates: list[tuple[int, str]]) -> int:
+    """Write (id, vector text) pairs with one UPDATE ... JOIN per chunk.
+
+    The pairs arrive as a UNION ALL derived table joined on the primary key,
+    so a batch costs one round-trip instead of one UPDATE per row. Does not
+    commit; returns rows updated.
+    """
+    updated = 0
+    with conn.cursor() as cursor:
+        for start in range(0, len(updates), UPDATE_CHUNK):
+            chunk = updates[start:start + UPDATE_CHUNK]
+            staged = " UNION ALL ".join(
+                ["SELECT %s AS id, %s AS vec"] + ["SELECT %s, %s"] * (len(chunk) - 1)
+            )
+            cursor.execute(
+                f"UPDATE log_events e JOIN ({staged}) s ON e.id = s.id "
+                f"SET e.embedding_vector = VEC_FromText(s.vec)",
+                [value for pair in chunk for value in pair],
+            )
+            updated += cursor.rowcount
+    return updated
+
+
+def fetch_batch(conn, last_id: int, batch_size: int) -> list[dict]:
+    """Next rows after last_id that still have no embedding."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT id, message FROM log_events "
+            "WHERE id > %s AND embedding_vector IS NULL "
+            "ORDER BY id LIMIT %s",
+            (last_id, batch_size),
+        )
+        return cursor.fetchall()
+
+
 def backfill(batch_size: int, delay: float = 0.0):
     conn = get_sync_connection()
     client = httpx.Client()
+    # One gateway call in flight at a time (same GPU load as before); the
+    # worker thread is the only user of client
+    embedder = ThreadPoolExecutor(max_workers=1)
     total_updated = 0
     total_failed = 0
     t_start = time.time()
@@ -64,38 +111,32 @@ def backfill(batch_size: int, delay: float = 0.0):
     print(f"Resuming from id > {last_id}")
 
     try:
-        while True:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT id, message FROM log_events "
-                    "WHERE id > %s AND embedding_vector IS NULL "
-                    "ORDER BY id LIMIT %s",
-                    (last_id, batch_size),
-                )
-                rows = cursor.fetchall()
-
-            if not rows:
-                elapsed = time.time() - t_start
-                print(f"Done. Updated {total_updated} rows, {total_failed} failures in {elapsed:.0f}s.")
-                break
-
-            messages = [row["message"] for row in rows]
-            embeddings = embed_batch_sync(client, messages)
-
-            batch_updated = 0
+        rows = fetch_batch(conn, last_id, batch_size)
+        pending = (
+            embedder.submit(embed_batch_sync, client, [row["message"] for row in rows])
+            if rows else None
+        )
+
+        while rows:
+            next_rows = fetch_batch(conn, rows[-1]["id"], batch_size)
+            embeddings = pending.result()
+
+            if delay > 0:
+                time.sleep(delay)
+            # Start the next gateway call before writing this batch back
+            pending = (
+                embedder.submit(embed_batch_sync, client, [row["message"] for row in next_rows])
+                if next_rows else None
+            )
+
+            updates = []
             for row, embedding in zip(rows, embeddings):
                 if embedding is None:
                     total_failed += 1
                     continue
+                updates.append((row["id"], _vec_to_text(embedding)))
 
-                vec_text = _vec_to_text(embedding)
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "UPDATE log_events SET embedding_vector = VEC_FromText(%s) WHERE id = %s",
-                        (vec_text, row["id"]),
-                    )
-                batch_updated += 1
-
+            batch_updated = update_embeddings(conn, updates) if updates else 0
             conn.commit()
             total_updated += batch_updated
             last_id = rows[-1]["id"]
@@ -106,14 +147,17 @@ def backfill(batch_size: int, delay: float = 0.0):
                   f"Failed: {total_failed} | Rate: {rate:.1f} rows/s | "
                   f"Elapsed: {elapsed:.0f}s | Last id: {last_id}")
 
-            if delay > 0:
-                time.sleep(delay)
+            rows = next_rows
+
+        elapsed = time.time() - t_start
+        print(f"Done. Updated {total_updated} rows, {total_failed} failures in {elapsed:.0f}s.")
 
     except KeyboardInterrupt:
         conn.commit()
         elapsed = time.time() - t_start
         print(f"\nInterrupted. Updated {total_updated} rows in {elapsed:.0f}s. Resume to continue.")
     finally:
+        embedder.shutdown(wait=True, cancel_futures=True)
         client.close()
         conn.close()
 
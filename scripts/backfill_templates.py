@@ -21,6 +21,7 @@ import hashlib
 import argparse
 
 import httpx
+import orjson
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -29,6 +30,7 @@ load_dotenv()
 
 from db.database import get_sync_connection
 from services.canonicalize import canonicalize, canon_hash, CANON_VERSION
+from scripts.template_writes import insert_templates, link_events
 
 GATEWAY_URL = os.getenv("GATEWAY_URL", "http://192.168.1.184:8001")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "qwen3-embedding:8b")
@@ -36,7 +38,7 @@ EMBEDDING_TIMEOUT = int(os.getenv("EMBEDDING_TIMEOUT", "120"))
 
 
 def _vec_to_text(vec: list[float]) -> str:
-    return "[" + ",".join(str(f) for f in vec) + "]"
+    return orjson.dumps(vec).decode()
 
 
 def embed_batch_sync(client: httpx.Client, texts: list[str]) -> list[list[float] | None]:
@@ -124,68 +126,31 @@ def backfill(batch_size: int, delay: float = 0.0, version: str = CANON_VERSION):
                 texts_list = [new_hashes_to_embed[h][0] for h in hashes_list]
                 embeddings = embed_batch_sync(http_client, texts_list)
 
+                template_rows = []
                 for t_hash, emb in zip(hashes_list, embeddings):
                     if emb is None:
                         total_failed += 1
                         continue
-
                     canonical, service, level, host = new_hashes_to_embed[t_hash]
-                    canon_hash_val = hashlib.sha256(canonical.encode()).hexdigest()[:32]
-                    vec_text = _vec_to_text(emb)
-
-                    for attempt in range(3):
-                        try:
-                            with conn.cursor() as cursor:
-                                cursor.execute("""
-                                    INSERT INTO log_templates
-                                        (template_hash, canonical_text, service, level,
-                                         embedding_vector, canon_version, canon_hash,
-                                         first_seen, last_seen, event_count, source_hosts)
-                                    VALUES (%s, %s, %s, %s, VEC_FromText(%s), %s, %s,
-                                            NOW(6), NOW(6), 0, %s)
-                                    ON DUPLICATE KEY UPDATE id=id
-                                """, (
-                                    t_hash, canonical, service, level,
-                                    vec_text, version, canon_hash_val,
-                                    json.dumps([host]),
-                                ))
-                                new_id = cursor.lastrowid
-                            conn.commit()
-                            if new_id:
-                                template_map[t_hash] = new_id
-                                total_new_templates += 1
-                            else:
-                                with conn.cursor() as cursor:
-                                    cursor.execute(
-                                        "SELECT id FROM log_templates WHERE template_hash = %s",
-                                        (t_hash,),
-                                    )
-                                    existing = cursor.fetchone()
-                                    if existing:
-                                        template_map[t_hash] = existing["id"]
-                            break
-                        except Exception as e:
-                            conn.rollback()
-                            if attempt < 2 and ("1020" in str(e) or "1213" in str(e)):
-                                time.sleep(0.2)
-                            else:
-                                print(f"  Template insert failed for {t_hash}: {e}")
-                                break
-
-            # Link log_events to templates
+                    template_rows.append((
+                        t_hash, canonical, service, level,
+                        _vec_to_text(emb), version,
+                        hashlib.sha256(canonical.encode()).hexdigest()[:32],
+                        json.dumps([host]),
+                    ))
+                if template_rows:
+                    total_new_templates += insert_templates(conn, template_rows, template_map)
+
+            # Link log_events to templates (one UPDATE per template, not per row)
             hash_counts: dict[str, int] = {}
-            with conn.cursor() as cursor:
-                for row, t_hash, canonical in batch_keys:
-                    tid = template_map.get(t_hash)
-                    if tid is None:
-                        continue
-                    cursor.execute(
-                        "UPDATE log_events SET template_id = %s WHERE id = %s",
-                        (tid, row["id"]),
-                    )
-                    total_linked += 1
-                    hash_counts[t_hash] = hash_counts.get(t_hash, 0) + 1
-            conn.commit()
+            ids_by_template: dict[int, list[int]] = {}
+            for row, t_hash, canonical in batch_keys:
+                tid = template_map.get(t_hash)
+                if tid is None:
+                    continue
+                ids_by_template.setdefault(tid, []).append(row["id"])
+                hash_counts[t_hash] = hash_counts.get(t_hash, 0) + 1
+            total_linked += link_events(conn, ids_by_template)
 
             # Update event_count (separate transaction, retry on row conflict)
             for t_hash, cnt in hash_counts.items():
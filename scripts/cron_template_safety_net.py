@@ -20,6 +20,7 @@ import hashlib
 import argparse
 
 import httpx
+import orjson
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -28,6 +29,7 @@ load_dotenv()
 
 from db.database import get_sync_connection
 from services.canonicalize import canonicalize, canon_hash, CANON_VERSION
+from scripts.template_writes import insert_templates, link_events
 
 GATEWAY_URL = os.getenv("GATEWAY_URL", "http://192.168.1.184:8001")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "qwen3-embedding:8b")
@@ -36,7 +38,7 @@ MAX_ROWS = 10000  # Safety cap per run
 
 
 def _vec_to_text(vec: list[float]) -> str:
-    return "[" + ",".join(str(f) for f in vec) + "]"
+    return orjson.dumps(vec).decode()
 
 
 def embed_batch_sync(client: httpx.Client, texts: list[str]) -> list[list[float] | None]:
@@ -123,64 +125,27 @@ def run_safety_net(batch_size: int, delay: float = 0.0):
                 texts_list = [new_hashes[h][0] for h in hashes_list]
                 embeddings = embed_batch_sync(http_client, texts_list)
 
+                template_rows = []
                 for t_hash, emb in zip(hashes_list, embeddings):
                     if emb is None:
                         continue
                     canonical, service, level, host = new_hashes[t_hash]
-                    canon_hash_val = hashlib.sha256(canonical.encode()).hexdigest()[:32]
-                    vec_text = _vec_to_text(emb)
-
-                    for attempt in range(3):
-                        try:
-                            with conn.cursor() as cursor:
-                                cursor.execute("""
-                                    INSERT INTO log_templates
-                                        (template_hash, canonical_text, service, level,
-                                         embedding_vector, canon_version, canon_hash,
-                                         first_seen, last_seen, event_count, source_hosts)
-                                    VALUES (%s, %s, %s, %s, VEC_FromText(%s), %s, %s,
-                                            NOW(6), NOW(6), 0, %s)
-                                    ON DUPLICATE KEY UPDATE id=id
-                                """, (
-                                    t_hash, canonical, service, level,
-                                    vec_text, CANON_VERSION, canon_hash_val,
-                                    json.dumps([host]),
-                                ))
-                                new_id = cursor.lastrowid
-                            conn.commit()
-                            if new_id:
-                                template_map[t_hash] = new_id
-                                total_new += 1
-                            else:
-                                with conn.cursor() as cursor:
-                                    cursor.execute(
-                                        "SELECT id FROM log_templates WHERE template_hash = %s",
-                                        (t_hash,),
-                                    )
-                                    existing = cursor.fetchone()
-                                    if existing:
-                                        template_map[t_hash] = existing["id"]
-                            break
-                        except Exception as e:
-                            conn.rollback()
-                            if attempt < 2 and ("1020" in str(e) or "1213" in str(e)):
-                                time.sleep(0.2)
-                            else:
-                                print(f"  Template insert failed for {t_hash}: {e}")
-                                break
-
-            # Link events
-            with conn.cursor() as cursor:
-                for row, t_hash in batch_keys:
-                    tid = template_map.get(t_hash)
-                    if tid is None:
-                        continue
-                    cursor.execute(
-                        "UPDATE log_events SET template_id = %s WHERE id = %s",
-                        (tid, row["id"]),
-                    )
-                    total_linked += 1
-            conn.commit()
+                    template_rows.append((
+                        t_hash, canonical, service, level,
+                        _vec_to_text(emb), CANON_VERSION,
+                        hashlib.sha256(canonical.encode()).hexdigest()[:32],
+                        json.dumps([host]),
+                    ))
+                if template_rows:
+                    total_new += insert_templates(conn, template_rows, template_map)
+
+            # Link events (one UPDATE per template, not per row)
+            ids_by_template: dict[int, list[int]] = {}
+            for row, t_hash in batch_keys:
+                tid = template_map.get(t_hash)
+                if tid is not None:
+                    ids_by_template.setdefault(tid, []).append(row["id"])
+            total_linked += link_events(conn, ids_by_template)
 
             rows_processed += len(rows)
             last_id = rows[-1]["id"]
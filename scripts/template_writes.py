@@ -0,0 +1,80 @@
+"""
+Shared log_templates / log_events writes for the template backfill scripts.
+
+Used by backfill_templates.py and cron_template_safety_net.py so retry and
+chunking fixes land in one place.
+"""
+
+import time
+
+# Templates per multi-row INSERT: each row carries ~40KB of vector text, so
+# 100 rows stays well under MariaDB's max_allowed_packet
+TEMPLATE_INSERT_CHUNK = 100
+
+_TEMPLATE_INSERT_PREFIX = """
+    INSERT INTO log_templates
+        (template_hash, canonical_text, service, level,
+         embedding_vector, canon_version, canon_hash,
+         first_seen, last_seen, event_count, source_hosts)
+    VALUES """
+_TEMPLATE_ROW_SQL = "(%s, %s, %s, %s, VEC_FromText(%s), %s, %s, NOW(6), NOW(6), 0, %s)"
+
+
+def insert_templates(conn, template_rows: list[tuple], template_map: dict[str, int]) -> int:
+    """Insert new templates with multi-row VALUES, then map their ids in one SELECT.
+
+    template_rows are parameter tuples for _TEMPLATE_ROW_SQL, template_hash first.
+    Retries the whole batch on row conflict/deadlock. Commits; returns the number
+    of templates actually created (rows another writer inserted first count 0).
+    """
+    hashes = [row[0] for row in template_rows]
+    for attempt in range(3):
+        try:
+            created = 0
+            with conn.cursor() as cursor:
+                for start in range(0, len(template_rows), TEMPLATE_INSERT_CHUNK):
+                    chunk = template_rows[start:start + TEMPLATE_INSERT_CHUNK]
+                    cursor.execute(
+                        _TEMPLATE_INSERT_PREFIX
+                        + ", ".join([_TEMPLATE_ROW_SQL] * len(chunk))
+                        + " ON DUPLICATE KEY UPDATE id=id",
+                        [value for row in chunk for value in row],
+                    )
+                    created += cursor.rowcount
+                placeholders = ", ".join(["%s"] * len(hashes))
+                cursor.execute(
+                    f"SELECT template_hash, id FROM log_templates "
+                    f"WHERE template_hash IN ({placeholders})",
+                    hashes,
+                )
+                for row in cursor.fetchall():
+                    template_map[row["template_hash"]] = row["id"]
+            conn.commit()
+            return created
+        except Exception as e:
+            conn.rollback()
+            if attempt < 2 and ("1020" in str(e) or "1213" in str(e)):
+                time.sleep(0.2)
+            else:
+                print(f"  Template insert failed for {len(template_rows)} templates: {e}")
+                return 0
+    return 0
+
+
+def link_events(conn, ids_by_template: dict[int, list[int]]) -> int:
+    """Set template_id on log_events, one UPDATE ... WHERE id IN per template.
+
+    Batches compress ~150x onto templates, so this is a handful of statements
+    on one cursor instead of one round-trip per row. Commits; returns rows linked.
+    """
+    linked = 0
+    with conn.cursor() as cursor:
+        for tid, ids in ids_by_template.items():
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"UPDATE log_events SET template_id = %s WHERE id IN ({placeholders})",
+                (tid, *ids),
+            )
+            linked += len(ids)
+    conn.commit()
+    return linked
@@ -7,7 +7,10 @@ Falls back to single-text /api/embeddings (Ollama native) for embed_text().
 """
 
 import os
+import asyncio
 import logging
+from array import array
+from collections import OrderedDict
 from typing import Optional
 
 import httpx
@@ -17,6 +20,52 @@ logger = logging.getLogger(__name__)
 GATEWAY_URL = os.getenv("GATEWAY_URL", "http://192.168.1.184:8001")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "qwen3-embedding:8b")
 EMBEDDING_TIMEOUT = int(os.getenv("EMBEDDING_TIMEOUT", "120"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+# Search query text -> embedding, separate so ingest churn doesn't evict queries
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "256"))
+# Larger batches are split into sub-batches of this size, sent concurrently
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_MAX_INFLIGHT = int(os.getenv("EMBEDDING_MAX_INFLIGHT", "4"))
+# Upper bound on a gateway Retry-After we are willing to wait out
+_MAX_RETRY_AFTER = 10.0
+
+
+class EmbeddingCache:
+    """LRU cache for text -> embedding, so repeated log messages skip the gateway.
+
+    Vectors are stored as float64 arrays (32KB at 4096 dims vs ~130KB as a
+    list of Python floats). Not float32: widened back to double, float32 values
+    re-serialize with ~17 significant digits, inflating the VEC_FromText text of
+    every cache hit by ~70% over the gateway's shortest-repr floats.
+    """
+
+    def __init__(self, max_size: int = EMBEDDING_CACHE_SIZE):
+        self._cache: OrderedDict[str, array] = OrderedDict()
+        self._max_size = max_size
+
+    def get(self, text: str) -> Optional[array]:
+        """Look up an embedding by text. Returns None on miss."""
+        vec = self._cache.get(text)
+        if vec is not None:
+            self._cache.move_to_end(text)
+        return vec
+
+    def put(self, text: str, embedding: list[float]) -> array:
+        """Insert an embedding, evicting the oldest entry when full."""
+        vec = array("d", embedding)
+        if text in self._cache:
+            self._cache.move_to_end(text)
+        elif len(self._cache) >= self._max_size:
+            self._cache.popitem(last=False)
+        self._cache[text] = vec
+        return vec
+
+    @property
+    def size(self) -> int:
+        return len(self._cache)
+
+    def clear(self) -> None:
+        self._cache.clear()
 
 
 async def embed_text(
@@ -36,25 +85,33 @@ async def embed_text(
         return None
 
 
-async def embed_batch(
+def _retry_after_seconds(resp: httpx.Response) -> float:
+    """Parse a 429's Retry-After header (seconds form), capped at _MAX_RETRY_AFTER."""
+    try:
+        return min(float(resp.headers.get("Retry-After", "1")), _MAX_RETRY_AFTER)
+    except ValueError:
+        return 1.0
+
+
+async def _embed_sub_batch(
     client: httpx.AsyncClient, texts: list[str]
 ) -> list[Optional[list[float]]]:
-    """Embed a list of texts via the OpenAI-compatible batch endpoint.
+    """One /v1/embeddings call, waiting out a single 429 before giving up.
 
-    Uses /v1/embeddings which accepts multiple inputs in one request.
-    Returns list of embeddings (None for the entire batch on failure,
-    falls back to sequential single-text calls).
+    Falls back to sequential single-text calls if the batch request fails.
     """
-    if not texts:
-        return []
-
     try:
-        resp = await client.post(
-            f"{GATEWAY_URL}/v1/embeddings",
-            json={"model": EMBEDDING_MODEL, "input": texts},
-            timeout=EMBEDDING_TIMEOUT,
-        )
-        resp.raise_for_status()
+        for attempt in range(2):
+            resp = await client.post(
+                f"{GATEWAY_URL}/v1/embeddings",
+                json={"model": EMBEDDING_MODEL, "input": texts},
+                timeout=EMBEDDING_TIMEOUT,
+            )
+            if resp.status_code == 429 and attempt == 0:
+                await asyncio.sleep(_retry_after_seconds(resp))
+                continue
+            resp.raise_for_status()
+            break
         data = resp.json()["data"]
         # Sort by index to guarantee order matches input
         data.sort(key=lambda x: x["index"])
@@ -66,3 +123,78 @@ async def embed_batch(
         for text in texts:
             results.append(await embed_text(client, text))
         return results
+
+
+async def embed_batch(
+    client: httpx.AsyncClient, texts: list[str]
+) -> list[Optional[list[float]]]:
+    """Embed a list of texts via the OpenAI-compatible batch endpoint.
+
+    Uses /v1/embeddings which accepts multiple inputs in one request.
+    Batches over EMBEDDING_BATCH_SIZE are sorted by text length, split into
+    sub-batches and sent with up to EMBEDDING_MAX_INFLIGHT requests in flight;
+    similar-length inputs pad less on the GPU. Results come back in input
+    order, with None for texts that could not be embedded.
+    """
+    if not texts:
+        return []
+    if len(texts) <= EMBEDDING_BATCH_SIZE:
+        return await _embed_sub_batch(client, texts)
+
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    chunks = [order[i:i + EMBEDDING_BATCH_SIZE]
+              for i in range(0, len(order), EMBEDDING_BATCH_SIZE)]
+    inflight = asyncio.Semaphore(EMBEDDING_MAX_INFLIGHT)
+
+    async def run(chunk: list[int]) -> list[Optional[list[float]]]:
+        async with inflight:
+            return await _embed_sub_batch(client, [texts[i] for i in chunk])
+
+    results: list[Optional[list[float]]] = [None] * len(texts)
+    for chunk, embeddings in zip(chunks, await asyncio.gather(*map(run, chunks))):
+        for i, emb in zip(chunk, embeddings):
+            results[i] = emb
+    return results
+
+
+async def embed_text_cached(
+    client: httpx.AsyncClient, text: str, cache: EmbeddingCache
+) -> Optional[array]:
+    """Embed one search query via embed_text(), serving repeats from the cache.
+
+    The key collapses whitespace only: case and punctuation can change the
+    embedding, so they are left alone. Failures are not cached.
+    """
+    key = " ".join(text.split())
+    vec = cache.get(key)
+    if vec is None:
+        emb = await embed_text(client, key)
+        if emb is not None:
+            vec = cache.put(key, emb)
+    return vec
+
+
+async def embed_batch_cached(
+    client: httpx.AsyncClient, texts: list[str], cache: EmbeddingCache
+) -> list[Optional[array]]:
+    """Embed texts via embed_batch(), serving repeats from the cache.
+
+    Only distinct cache misses are sent to the gateway, in one batch call;
+    failed embeddings are not cached.
+    """
+    results: list[Optional[array]] = [cache.get(text) for text in texts]
+    # Distinct missing text -> positions in the batch that need it
+    misses: dict[str, list[int]] = {}
+    for i, vec in enumerate(results):
+        if vec is None:
+            misses.setdefault(texts[i], []).append(i)
+    if not misses:
+        return results
+
+    embeddings = await embed_batch(client, list(misses))
+    for (text, positions), emb in zip(misses.items(), embeddings):
+        if emb is not None:
+            vec = cache.put(text, emb)
+            for i in positions:
+                results[i] = vec
+    return results
@@ -6,10 +6,10 @@ Ingests logs from journald and ships them to the DevMesh API
 
 import os
 import sys
-import json
 import subprocess
 from datetime import datetime, timezone
 from typing import List, Dict, Any
+import orjson
 import requests
 from dotenv import load_dotenv
 
@@ -58,8 +58,8 @@ def get_journald_logs(since_hours: int = 24) -> List[Dict[str, Any]]:
         for line in result.stdout.strip().split('\n'):
             if line:
                 try:
-                    logs.append(json.loads(line))
-                except json.JSONDecodeError as e:
+                    logs.append(orjson.loads(line))
+                except orjson.JSONDecodeError as e:
                     print(f"Warning: Failed to parse JSON line: {e}")
                     continue
 
@@ -81,7 +81,8 @@ def ingest_batch(logs: List[Dict[str, Any]]) -> Dict[str, Any]:
     payload = {"logs": logs}
 
     try:
-        response = requests.post(url, json=payload, headers=_get_request_headers(), timeout=30)
+        response = requests.post(url, data=orjson.dumps(payload),
+                                 headers=_get_request_headers(), timeout=30)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
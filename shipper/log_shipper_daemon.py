@@ -13,12 +13,12 @@ import sys
 # Force unbuffered output for real-time logging
 sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', buffering=1)
 sys.stderr = os.fdopen(sys.stderr.fileno(), 'w', buffering=1)
-import json
 import subprocess
 import time
 import signal
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
+import orjson
 import requests
 from dotenv import load_dotenv
 
@@ -103,11 +103,11 @@ def _spool_failed_batch(logs: List[Dict[str, Any]]):
     try:
         os.makedirs(os.path.dirname(FAILED_BATCHES_FILE) or '.', exist_ok=True)
         with open(FAILED_BATCHES_FILE, 'a') as f:
-            f.write(json.dumps({
+            f.write(orjson.dumps({
                 "timestamp": datetime.now(timezone.utc).isoformat(),
                 "count": len(logs),
                 "logs": logs,
-            }) + '\n')
+            }).decode() + '\n')
         print(f"[SPOOL] Wrote {len(logs)} logs to dead-letter spool")
     except Exception as e:
         print(f"[ERROR] Failed to write dead-letter spool: {e}")
@@ -129,13 +129,13 @@ def _replay_spooled_batches():
                 if not line:
                     continue
                 try:
-                    batch_record = json.loads(line)
+                    batch_record = orjson.loads(line)
                     logs = batch_record.get('logs', [])
                     if ingest_batch(logs):
                         replayed += len(logs)
                     else:
                         remaining.append(line)
-                except (json.JSONDecodeError, Exception) as e:
+                except (orjson.JSONDecodeError, Exception) as e:
                     print(f"[WARN] Failed to replay spool entry: {e}")
                     remaining.append(line)
 
@@ -161,7 +161,9 @@ def ingest_batch(logs: List[Dict[str, Any]]) -> bool:
     payload = {"logs": logs}
 
     try:
-        response = requests.post(url, json=payload, headers=_get_request_headers(), timeout=10)
+        # Encoded with orjson rather than requests' stdlib json= path
+        response = requests.post(url, data=orjson.dumps(payload),
+                                 headers=_get_request_headers(), timeout=10)
         response.raise_for_status()
         result = response.json()
 
@@ -224,7 +226,7 @@ def follow_journald():
                 continue
 
             try:
-                entry = json.loads(line)
+                entry = orjson.loads(line)
 
                 if '__CURSOR' in entry:
                     last_cursor = entry['__CURSOR']
@@ -270,7 +272,7 @@ def follow_journald():
                             _spool_failed_batch(batch)
                             batch = []
 
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 print(f"[WARN] Failed to parse JSON: {e}")
                 continue
             except Exception as e:
@@ -35,20 +35,27 @@ class MockCursor:
         self.results = results or []
         self.rowcount = 0
         self._executed = []
+        self._mogrified = 0
+
+    def mogrify(self, sql, params=None):
+        self._mogrified += 1
+        return sql % tuple(repr(p) for p in params) if params else sql
 
     async def execute(self, sql, params=None):
         self._executed.append((sql, params))
+        if sql.lstrip().startswith("INSERT") and params is None:
+            # Multi-row INSERT built from mogrify() — one row per mogrify call
+            self.rowcount = self._mogrified
+            self._mogrified = 0
+            return
         if "SELECT 1" in sql:
             self.results = [{"1": 1}]
-        elif "SELECT COUNT" in sql and "log_hash" in sql:
-            self.results = [{"cnt": 1}]
-        elif "SELECT COUNT" in sql and "embedding_vector" in sql:
-            self.results = [{"cnt": 0}]
+        elif "information_schema.columns" in sql:
+            # Only log_hash exists in test env: no event_hash, embedding_vector,
+            # template_id or log_templates — Python log_hash, old ingest path
+            self.results = [{"tbl": "log_events", "col": "log_hash"}]
         elif "SELECT COUNT" in sql and "log_templates" in sql:
-            # Template table does not exist in test env — use old ingest path
-            self.results = [{"cnt": 0}]
-        elif "SELECT COUNT" in sql and "template_id" in sql:
-            # template_id column does not exist in test env
+            # Template table does not exist in test env
             self.results = [{"cnt": 0}]
         elif "SELECT" in sql and "FROM log_events" in sql:
             # Query endpoint - return empty list (no rows)
@@ -85,6 +92,9 @@ class MockConnection:
     async def commit(self):
         pass
 
+    async def rollback(self):
+        pass
+
     async def __aenter__(self):
         return self
 
@@ -20,12 +20,15 @@ async def auth_client():
     with patch("db.database._pool", mock_pool), \
          patch("db.database.get_pool", return_value=mock_pool):
         from main import app
+        # Auth settings are read when the middleware stack is built
+        app.middleware_stack = None
         transport = ASGITransport(app=app)
         async with AsyncClient(transport=transport, base_url="http://test") as client:
             yield client
 
     # Reset
     os.environ["API_AUTH_ENABLED"] = "false"
+    app.middleware_stack = None
 
 
 @pytest.mark.asyncio
@@ -62,3 +65,24 @@ async def test_protected_path_accepted_with_correct_key(auth_client):
     )
     # Should not be 401 (may be other error due to mock DB, but auth passed)
     assert resp.status_code != 401
+
+
+@pytest.mark.asyncio
+async def test_protected_path_rejected_when_key_not_configured():
+    """Auth enabled without API_KEY should fail closed with 500."""
+    from main import app
+    from tests.conftest import MockPool
+    mock_pool = MockPool()
+
+    with patch.dict(os.environ, {"API_AUTH_ENABLED": "true"}), \
+         patch("db.database._pool", mock_pool), \
+         patch("db.database.get_pool", return_value=mock_pool):
+        os.environ.pop("API_KEY", None)
+        app.middleware_stack = None
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.get("/query/logs", headers={"X-API-Key": "anything"})
+    app.middleware_stack = None
+
+    assert resp.status_code == 500
+    assert resp.json()["error_code"] == "AUTH_NOT_CONFIGURED"
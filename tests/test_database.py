@@ -38,6 +38,56 @@ class TestRequiredEnvVars:
             assert _get_required_env("DB_PASSWORD") == "secret"
 
 
+class TestDbConfigCache:
+    """Config is parsed from env once and shared."""
+
+    def test_config_cached_until_reset(self):
+        from db.database import _db_config, _reset_db_config_cache
+        _reset_db_config_cache()
+        try:
+            with patch.dict(os.environ, {"DB_PASSWORD": "secret", "DB_PORT": "3307"}):
+                cfg = _db_config()
+                assert cfg.port == 3307
+                assert _db_config() is cfg
+                with pytest.raises(AttributeError):
+                    cfg.port = 1
+
+            with patch.dict(os.environ, {"DB_PASSWORD": "secret", "DB_PORT": "3308"}):
+                assert _db_config().port == 3307
+                _reset_db_config_cache()
+                assert _db_config().port == 3308
+        finally:
+            _reset_db_config_cache()
+
+
+class TestSyncDriver:
+    """DB_SYNC_DRIVER selects the sync connection driver."""
+
+    def test_unknown_driver_raises(self):
+        from db.database import get_sync_connection, _reset_db_config_cache
+        _reset_db_config_cache()
+        try:
+            with patch.dict(os.environ, {"DB_PASSWORD": "secret", "DB_SYNC_DRIVER": "odbc"}):
+                with pytest.raises(RuntimeError, match="DB_SYNC_DRIVER"):
+                    get_sync_connection()
+        finally:
+            _reset_db_config_cache()
+
+    def test_default_driver_is_pymysql(self):
+        from db.database import get_sync_connection, _reset_db_config_cache
+        _reset_db_config_cache()
+        try:
+            env = {k: v for k, v in os.environ.items() if k != "DB_SYNC_DRIVER"}
+            env["DB_PASSWORD"] = "secret"
+            with patch.dict(os.environ, env, clear=True), \
+                    patch("pymysql.connect", return_value="conn") as connect:
+                assert get_sync_connection() == "conn"
+                assert connect.call_args.kwargs["autocommit"] is False
+                assert connect.call_args.kwargs["unix_socket"] is None
+        finally:
+            _reset_db_config_cache()
+
+
 class TestPoolLifecycle:
     """H1/H2 - async pool init/close."""
 
@@ -64,9 +114,41 @@ class TestPoolLifecycle:
             "wait_closed": AsyncMock(),
         })()
 
-        with patch("aiomysql.create_pool", new_callable=AsyncMock, return_value=mock_pool):
+        with patch("aiomysql.create_pool", new_callable=AsyncMock, return_value=mock_pool) as create:
             await db_mod.init_pool()
             assert db_mod._pool is mock_pool
+            assert create.call_args.kwargs["pool_recycle"] > 0
+            assert "unix_socket" in create.call_args.kwargs
 
             await db_mod.close_pool()
             assert db_mod._pool is None
+
+
+class TestAsyncHealthProbe:
+    """Successful async probes are cached briefly; failures are not."""
+
+    @pytest.mark.asyncio
+    async def test_success_cached_failure_not(self):
+        import db.database as db_mod
+        from tests.conftest import MockPool
+
+        class CountingPool(MockPool):
+            acquires = 0
+
+            def acquire(self):
+                CountingPool.acquires += 1
+                return super().acquire()
+
+        original = db_mod._pool
+        db_mod._pool = CountingPool()
+        db_mod._health_ok_until = 0.0
+        try:
+            assert await db_mod.async_test_connection()
+            assert await db_mod.async_test_connection()
+            assert CountingPool.acquires == 1
+
+            db_mod._pool = None
+            assert not await db_mod.async_test_connection()
+        finally:
+            db_mod._pool = original
+            db_mod._health_ok_until = 0.0
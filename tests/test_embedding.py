@@ -0,0 +1,116 @@
+"""Tests for services/embedding.py — embedding cache."""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from services.embedding import EmbeddingCache, embed_batch, embed_batch_cached, embed_text_cached
+
+
+def test_cache_evicts_oldest():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("a", [0.5])
+    cache.put("b", [1.0])
+    cache.get("a")
+    cache.put("c", [2.0])
+    assert cache.get("b") is None
+    assert list(cache.get("a")) == [0.5]
+    assert cache.size == 2
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_cached_only_sends_misses():
+    cache = EmbeddingCache()
+    cache.put("seen", [1.0, 2.0])
+    mock_embed = AsyncMock(return_value=[[3.0, 4.0], None])
+    with patch("services.embedding.embed_batch", mock_embed):
+        result = await embed_batch_cached(None, ["seen", "new", "broken"], cache)
+
+    mock_embed.assert_awaited_once_with(None, ["new", "broken"])
+    assert [list(v) if v is not None else None for v in result] == [
+        [1.0, 2.0], [3.0, 4.0], None,
+    ]
+    # Failed embeddings are retried next time rather than cached
+    assert cache.get("broken") is None
+    assert cache.get("new") is not None
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_cached_dedupes_within_batch():
+    cache = EmbeddingCache()
+    mock_embed = AsyncMock(return_value=[[1.0], [2.0]])
+    with patch("services.embedding.embed_batch", mock_embed):
+        result = await embed_batch_cached(None, ["x", "y", "x", "x"], cache)
+
+    mock_embed.assert_awaited_once_with(None, ["x", "y"])
+    assert [list(v) for v in result] == [[1.0], [2.0], [1.0], [1.0]]
+
+
+@pytest.mark.asyncio
+async def test_embed_text_cached_normalizes_whitespace():
+    cache = EmbeddingCache()
+    mock_embed = AsyncMock(return_value=[0.5, 0.25])
+    with patch("services.embedding.embed_text", mock_embed):
+        first = await embed_text_cached(None, "disk  full\n", cache)
+        second = await embed_text_cached(None, " disk full", cache)
+
+    mock_embed.assert_awaited_once_with(None, "disk full")
+    assert list(first) == list(second) == [0.5, 0.25]
+
+
+def test_cached_vector_serializes_like_original():
+    """Cache hits should produce the same VECTOR text as the gateway response."""
+    from api.routes import _vec_to_text
+    cache = EmbeddingCache()
+    original = [0.1, -0.012345678, 0.3]
+    assert _vec_to_text(cache.put("t", original)) == _vec_to_text(original)
+
+
+class FakeResponse:
+    def __init__(self, inputs, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._inputs = inputs
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        # Reverse order exercises the index sort
+        return {"data": [{"index": i, "embedding": [float(len(t))]}
+                         for i, t in reversed(list(enumerate(self._inputs)))]}
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_splits_by_length_and_restores_order():
+    sent = []
+
+    async def post(url, json, timeout):
+        sent.append(json["input"])
+        return FakeResponse(json["input"])
+
+    client = AsyncMock()
+    client.post = post
+    texts = ["x" * n for n in (5, 1, 4, 2, 3)]
+    with patch("services.embedding.EMBEDDING_BATCH_SIZE", 2):
+        result = await embed_batch(client, texts)
+
+    assert sorted(map(len, sent)) == [1, 2, 2]
+    assert ["x", "xx"] in sent
+    assert result == [[5.0], [1.0], [4.0], [2.0], [3.0]]
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_waits_out_one_429():
+    calls = []
+
+    async def post(url, json, timeout):
+        calls.append(url)
+        if len(calls) == 1:
+            return FakeResponse(json["input"], 429, {"Retry-After": "0"})
+        return FakeResponse(json["input"])
+
+    client = AsyncMock()
+    client.post = post
+    assert await embed_batch(client, ["ab"]) == [[2.0]]
+    assert len(calls) == 2
@@ -1,11 +1,16 @@
 """Tests for API routes (ingestion and query)."""
 
+from datetime import datetime
+
+import aiomysql
 import pytest
 import pytest_asyncio
 from unittest.mock import patch
 from httpx import AsyncClient, ASGITransport
 
 from tests.conftest import MockPool, MockConnection, MockCursor
+from api.routes import _execute_multirow, compute_log_hash
+from models.schemas import LogEventCreate
 
 
 @pytest_asyncio.fixture
@@ -21,17 +26,101 @@ async def client():
          patch("db.database.get_pool", return_value=mock_pool):
         # Reset cached schema checks
         import api.routes
-        api.routes._has_hash_column = None
-        api.routes._has_embedding_column = None
-        api.routes._has_templates_table = None
-        api.routes._has_template_id_column = None
+        api.routes._schema_loaded = False
+        api.routes._schema_retry_at = 0.0
+        api.routes._has_hash_column = False
+        api.routes._has_event_hash_column = False
+        api.routes._has_embedding_column = False
+        api.routes._has_templates_table = False
+        api.routes._has_template_id_column = False
+
+        from main import app
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as c:
+            yield c
+
+
+class RowCursor(MockCursor):
+    """Mock cursor that returns canned rows for log_events SELECTs."""
+
+    def __init__(self, rows):
+        super().__init__()
+        self._rows = rows
+
+    async def execute(self, sql, params=None):
+        await super().execute(sql, params)
+        if "SELECT" in sql and "FROM log_events" in sql:
+            self.results = self._rows
+
 
+class RowConnection(MockConnection):
+    def __init__(self, rows):
+        super().__init__()
+        self._rows = rows
+
+    def cursor(self, *args, **kwargs):
+        # Plain aiomysql.Cursor requested: hand back tuples in column order
+        if args and args[0] is aiomysql.Cursor:
+            return RowCursor([tuple(r.values()) for r in self._rows])
+        return RowCursor(self._rows)
+
+
+SAMPLE_DB_ROW = {
+    "id": 42,
+    "timestamp": datetime(2025, 12, 1, 12, 0, 0),
+    "source": "journald",
+    "service": "test.service",
+    "host": "node-1",
+    "level": "ERROR",
+    "trace_id": None,
+    "span_id": None,
+    "event_type": None,
+    "error_code": None,
+    "message": "disk full",
+    "meta_json": '{"unit": "sda1", "pct": 99}',
+}
+
+
+@pytest_asyncio.fixture
+async def rows_client():
+    """Test client whose DB returns SAMPLE_DB_ROW for log_events queries."""
+    mock_pool = MockPool(RowConnection([SAMPLE_DB_ROW]))
+    with patch("db.database._pool", mock_pool), \
+         patch("db.database.get_pool", return_value=mock_pool):
         from main import app
         transport = ASGITransport(app=app)
         async with AsyncClient(transport=transport, base_url="http://test") as c:
             yield c
 
 
+@pytest.mark.asyncio
+async def test_query_decodes_rows(rows_client):
+    """Query rows should come back with level and meta_json decoded."""
+    resp = await rows_client.get("/query/logs")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert len(data) == 1
+    assert data[0]["id"] == 42
+    assert data[0]["level"] == "ERROR"
+    assert data[0]["timestamp"] == "2025-12-01T12:00:00"
+    assert data[0]["meta_json"] == {"unit": "sda1", "pct": 99}
+
+
+@pytest.mark.asyncio
+async def test_stream_log_rows_chunks_into_one_array():
+    """Chunked encoding should still produce a single valid JSON array."""
+    import orjson
+    from api.routes import _stream_log_rows, _QUERY_COLUMNS
+    row = tuple(SAMPLE_DB_ROW[c] for c in _QUERY_COLUMNS)
+    rows = [row, row[:11] + (None,), row]
+    with patch("api.routes._STREAM_CHUNK_ROWS", 2):
+        body = b"".join([chunk async for chunk in _stream_log_rows(rows)])
+    data = orjson.loads(body)
+    assert [e["meta_json"] for e in data] == [{"unit": "sda1", "pct": 99}, None,
+                                              {"unit": "sda1", "pct": 99}]
+    assert orjson.loads(b"".join([c async for c in _stream_log_rows([])])) == []
+
+
 @pytest.mark.asyncio
 async def test_ingest_happy_path(client, sample_log_batch):
     """Ingestion should return 201 with ingested count."""
@@ -42,6 +131,101 @@ async def test_ingest_happy_path(client, sample_log_batch):
     assert data["failed"] == 0
 
 
+@pytest.mark.asyncio
+async def test_ingest_counts_whole_batch(client, sample_log_event):
+    """Every row in the batch should be reported as ingested."""
+    batch = {"logs": [dict(sample_log_event, message=f"msg {i}") for i in range(3)]}
+    resp = await client.post("/ingest/logs", json=batch)
+    assert resp.status_code == 201
+    assert resp.json()["ingested"] == 3
+
+
+@pytest.mark.asyncio
+async def test_execute_multirow_single_statement():
+    """Rows with VEC_FromText placeholders should go out as one INSERT."""
+    cursor = MockCursor()
+    rows = [(1, "[0.1]"), (2, "[0.2]"), (3, "[0.3]")]
+    affected = await _execute_multirow(
+        cursor, "INSERT INTO t (a, v) VALUES ", "(%s, VEC_FromText(%s))", rows,
+    )
+    assert affected == 3
+    assert len(cursor._executed) == 1
+    assert cursor._executed[0][0].count("VEC_FromText") == 3
+
+
+@pytest.mark.asyncio
+async def test_execute_multirow_splits_large_batches():
+    """Statements should be chunked to stay under the byte limit."""
+    cursor = MockCursor()
+    rows = [(i, "x" * 1000) for i in range(10)]
+    with patch("api.routes._MAX_INSERT_BYTES", 2500):
+        affected = await _execute_multirow(
+            cursor, "INSERT INTO t (a, b) VALUES ", "(%s, %s)", rows,
+        )
+    assert affected == 10
+    assert len(cursor._executed) == 5
+
+
+@pytest.mark.asyncio
+async def test_execute_multirow_caps_rows_per_statement():
+    """Small rows should still be chunked at the per-statement row cap."""
+    cursor = MockCursor()
+    rows = [(i,) for i in range(7)]
+    with patch("api.routes._MAX_INSERT_ROWS", 3):
+        affected = await _execute_multirow(cursor, "INSERT INTO t (a) VALUES ", "(%s)", rows)
+    assert affected == 7
+    assert [sql.count("(") for sql, _ in cursor._executed] == [4, 4, 2]
+
+
+@pytest.mark.asyncio
+async def test_ingest_rolls_back_failed_insert(sample_log_batch):
+    """A failed INSERT should roll back before the connection goes back to the pool."""
+    from unittest.mock import AsyncMock
+
+    class FailingCursor(MockCursor):
+        async def execute(self, sql, params=None):
+            if sql.lstrip().startswith("INSERT"):
+                raise RuntimeError("lock wait timeout")
+            await super().execute(sql, params)
+
+    class FailingConnection(MockConnection):
+        def cursor(self, *args, **kwargs):
+            return FailingCursor()
+
+    conn = FailingConnection()
+    conn.rollback = AsyncMock()
+    conn.commit = AsyncMock()
+    with patch("db.database._pool", MockPool(conn)):
+        from main import app
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as c:
+            resp = await c.post("/ingest/logs", json=sample_log_batch)
+    assert resp.status_code == 500
+    assert resp.json()["error_code"] == "INGESTION_FAILED"
+    conn.rollback.assert_awaited_once()
+    conn.commit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_ingest_drops_in_batch_duplicates(client, sample_log_event):
+    """Repeats within one batch should be dropped before the INSERT."""
+    other = dict(sample_log_event, message="a different message")
+    resp = await client.post(
+        "/ingest/logs", json={"logs": [sample_log_event, other, sample_log_event]})
+    assert resp.status_code == 201
+    assert resp.json()["ingested"] == 2
+    assert resp.json()["duplicates"] == 1
+
+
+@pytest.mark.asyncio
+async def test_ingest_with_meta_json(client, sample_log_event):
+    """Events carrying meta_json should serialize and ingest."""
+    event = dict(sample_log_event, meta_json={"unit": "sda1", "tags": ["a", "b"]})
+    resp = await client.post("/ingest/logs", json={"logs": [event]})
+    assert resp.status_code == 201
+    assert resp.json()["ingested"] == 1
+
+
 @pytest.mark.asyncio
 async def test_ingest_empty_batch(client):
     """Empty logs list should return 400."""
@@ -77,8 +261,518 @@ async def test_query_with_filters(client):
     assert resp.status_code == 200
 
 
+def test_query_logs_sql_shapes():
+    """Each filter bitmask should map to a WHERE clause in fixed filter order."""
+    from api.routes import _QUERY_LOGS_SQL
+    assert len(_QUERY_LOGS_SQL) == 32
+    assert "WHERE" not in _QUERY_LOGS_SQL[0]
+    assert "WHERE service = %s AND level = %s\n" in _QUERY_LOGS_SQL[0b00101]
+    assert _QUERY_LOGS_SQL[0b11111].count("%s") == 7
+
+
 @pytest.mark.asyncio
 async def test_query_pagination(client):
     """Query with offset should not error."""
     resp = await client.get("/query/logs", params={"limit": 5, "offset": 10})
     assert resp.status_code == 200
+
+
+def test_log_hash_is_16_hex_chars(sample_log_event):
+    """Dedup hash should fit the VARCHAR(16) log_hash column."""
+    h = compute_log_hash(LogEventCreate(**sample_log_event))
+    assert len(h) == 16
+    int(h, 16)
+
+
+def test_log_hash_sha256_mode_matches_legacy(sample_log_event):
+    """LOG_HASH_ALGO=sha256 should reproduce pre-xxh3 hashes."""
+    import hashlib
+    log = LogEventCreate(**sample_log_event)
+    content = f"{log.timestamp}|{log.host}|{log.service}|{log.message}"
+    with patch("api.routes.LOG_HASH_ALGO", "sha256"):
+        assert compute_log_hash(log) == hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+def test_log_hashes_match_single_hash(sample_log_event):
+    """Batch hashing should agree with compute_log_hash in both modes."""
+    from api.routes import compute_log_hashes
+    logs = [LogEventCreate(**sample_log_event),
+            LogEventCreate(**{**sample_log_event, "timestamp": "2025-12-01T12:00:00.123456"})]
+    with patch("api.routes.LOG_HASH_ALGO", "xxh3"):
+        assert compute_log_hashes(logs) == [compute_log_hash(log) for log in logs]
+    with patch("api.routes.LOG_HASH_ALGO", "sha256"):
+        assert compute_log_hashes(logs) == [compute_log_hash(log) for log in logs]
+
+
+@pytest.mark.asyncio
+async def test_warm_schema_cache_populates_hash_flag():
+    """Startup warm-up should resolve the hash-column flag once."""
+    import api.routes
+    mock_pool = MockPool()
+    with patch("api.routes.get_pool", return_value=mock_pool), \
+         patch("api.routes._schema_loaded", False), \
+         patch("api.routes._has_hash_column", False):
+        api.routes._ingest_plan.cache_clear()
+        await api.routes.warm_schema_cache()
+        assert api.routes._schema_loaded is True
+        assert api.routes._has_hash_column is True
+        # The ingest plan for these flags is already built
+        assert api.routes._ingest_plan.cache_info().currsize == 1
+
+
+@pytest.mark.asyncio
+async def test_warm_schema_cache_fails_fast_without_log_events():
+    """A reachable database with no log_events table should abort startup."""
+    import api.routes
+    from errors import ConfigurationError
+
+    class EmptySchemaCursor(MockCursor):
+        async def execute(self, sql, params=None):
+            self.results = []
+
+    class EmptySchemaConnection(MockConnection):
+        def cursor(self, *args, **kwargs):
+            return EmptySchemaCursor()
+
+    with patch("api.routes.get_pool", return_value=MockPool(EmptySchemaConnection())), \
+         patch.multiple("api.routes", _schema_loaded=False, _log_events_missing=False):
+        with pytest.raises(ConfigurationError):
+            await api.routes.warm_schema_cache()
+
+
+@pytest.mark.asyncio
+async def test_failed_schema_probe_is_retried_later():
+    """A failed probe should not pin the flags; it retries after the backoff."""
+    import api.routes
+
+    class FailingPool(MockPool):
+        attempts = 0
+
+        def acquire(self):
+            FailingPool.attempts += 1
+            raise ConnectionError("db unavailable")
+
+    with patch("api.routes.get_pool", return_value=FailingPool()), \
+         patch.multiple("api.routes", _schema_loaded=False, _schema_retry_at=0.0,
+                        _has_hash_column=False):
+        await api.routes._load_schema_flags()
+        await api.routes._load_schema_flags()
+        assert api.routes._schema_loaded is False
+        assert FailingPool.attempts == 1
+
+        api.routes._schema_retry_at = 0.0
+        with patch("api.routes.get_pool", return_value=MockPool()):
+            await api.routes._load_schema_flags()
+        assert api.routes._schema_loaded is True
+        assert api.routes._has_hash_column is True
+
+
+@pytest.mark.asyncio
+async def test_event_hash_flag_requires_unique_index():
+    """event_hash without idx_event_hash (half-applied 004) should keep log_hash dedup."""
+    import api.routes
+
+    def pool_returning(rows):
+        class ProbeConnection(MockConnection):
+            def cursor(self, *args, **kwargs):
+                cursor = MockCursor()
+
+                async def execute(sql, params=None):
+                    cursor.results = rows
+
+                cursor.execute = execute
+                return cursor
+
+        return MockPool(ProbeConnection())
+
+    column_only = [{"tbl": "log_events", "col": "log_hash"},
+                   {"tbl": "log_events", "col": "event_hash"}]
+    for rows, expected in ((column_only, False),
+                           (column_only + [{"tbl": "log_events", "col": "idx_event_hash"}], True)):
+        with patch("api.routes.get_pool", return_value=pool_returning(rows)), \
+             patch.multiple("api.routes", _schema_loaded=False, _schema_retry_at=0.0,
+                            _has_event_hash_column=False):
+            await api.routes._load_schema_flags()
+            assert api.routes._has_event_hash_column is expected
+
+
+@pytest.mark.asyncio
+async def test_warm_schema_cache_skips_without_pool():
+    """A missing pool at startup should leave the flags unresolved."""
+    import api.routes
+    with patch("api.routes.get_pool", side_effect=RuntimeError("no pool")), \
+         patch("api.routes._schema_loaded", False):
+        await api.routes.warm_schema_cache()
+        assert api.routes._schema_loaded is False
+
+
+@pytest.mark.asyncio
+async def test_schema_flags_resolve_in_one_query():
+    """A cold schema cache should resolve every flag with a single query."""
+    import api.routes
+    executed = []
+
+    class RecordingConnection(MockConnection):
+        def cursor(self, *args, **kwargs):
+            cursor = MockCursor()
+            execute = cursor.execute
+
+            async def recording_execute(sql, params=None):
+                executed.append(sql)
+                await execute(sql, params)
+
+            cursor.execute = recording_execute
+            return cursor
+
+    mock_pool = MockPool(RecordingConnection())
+    with patch("api.routes.get_pool", return_value=mock_pool), \
+         patch.multiple("api.routes", _schema_loaded=False, _has_hash_column=False,
+                        _has_event_hash_column=False, _has_embedding_column=False,
+                        _has_templates_table=False, _has_template_id_column=False):
+        await api.routes._load_schema_flags()
+        # Warm cache: no further queries
+        await api.routes._load_schema_flags()
+        flags = (api.routes._has_hash_column, api.routes._has_event_hash_column,
+                 api.routes._has_embedding_column, api.routes._has_templates_table,
+                 api.routes._has_template_id_column)
+    assert flags == (True, False, False, False, False)
+    assert len(executed) == 1
+
+
+def test_row_builder_matches_insert_shape():
+    """Generated row builders should line up with the INSERT placeholders."""
+    from itertools import product
+    from api.routes import _insert_statement, _row_builder
+    log = LogEventCreate(
+        timestamp=datetime(2025, 12, 1, 12, 0, 0), source="journald", service="svc",
+        host="node-1", level="ERROR", message="disk full", meta_json={"pct": 99},
+    )
+    for has_hash, has_emb, has_tid in product((False, True), repeat=3):
+        row = _row_builder(has_hash, has_emb, has_tid)(log, "abc", [0.5], 7)
+        _, row_sql = _insert_statement(has_hash, has_emb, has_tid, False)
+        assert len(row) == row_sql.count("%s")
+        last = row[-1].text if has_emb and not has_tid else row[-1]
+        assert last == (7 if has_tid else "[0.5]" if has_emb else '{"pct":99}')
+    row = _row_builder(True, True, False)(log, "abc", None, None)
+    assert row[0] == "abc"
+    assert row[5] == "ERROR"
+    assert row[-1] is None
+
+
+def test_ingest_plan_switches():
+    """Templates suppress per-row embeddings; event_hash suppresses log_hash."""
+    from api.routes import _ingest_plan
+    use_templates, use_embedding, compute_hash, dedup, *_ = _ingest_plan(
+        True, False, True, True, True)
+    assert (use_templates, use_embedding, compute_hash, dedup) == (True, False, True, True)
+    use_templates, use_embedding, compute_hash, dedup, *_ = _ingest_plan(
+        True, True, True, False, False)
+    assert (use_templates, use_embedding, compute_hash, dedup) == (False, True, False, True)
+    assert _ingest_plan(True, True, True, False, False) is _ingest_plan(True, True, True, False, False)
+
+
+def test_insert_statement_shapes():
+    """INSERT column list and placeholders should track the schema flags."""
+    from api.routes import _insert_statement
+    prefix, row_sql = _insert_statement(True, True, True, True)
+    assert prefix.startswith("INSERT IGNORE INTO log_events (log_hash, timestamp")
+    assert prefix.endswith("embedding_vector, template_id) VALUES ")
+    assert row_sql.count("%s") == 14
+    assert "VEC_FromText(%s), %s)" in row_sql
+
+    prefix, row_sql = _insert_statement(False, False, False, False)
+    assert prefix.startswith("INSERT INTO log_events (timestamp")
+    assert row_sql.count("%s") == 11
+    assert _insert_statement(False, False, False, False) is _insert_statement(False, False, False, False)
+
+    # DB-side event_hash dedup: no log_hash column, still INSERT IGNORE
+    prefix, row_sql = _insert_statement(False, False, False, True)
+    assert prefix.startswith("INSERT IGNORE INTO log_events (timestamp")
+
+
+@pytest.mark.asyncio
+async def test_search_logs_returns_similarity():
+    """Semantic search should map rows and convert distance to similarity."""
+    from unittest.mock import AsyncMock
+    row = dict(SAMPLE_DB_ROW, distance=0.25)
+    mock_pool = MockPool(RowConnection([row]))
+    with patch("db.database._pool", mock_pool), \
+         patch("api.routes.embed_text", new=AsyncMock(return_value=[0.1, 0.2])):
+        from main import app
+        app.state.http_client = object()
+        try:
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as c:
+                resp = await c.get("/search/logs", params={"query": "disk full"})
+        finally:
+            del app.state.http_client
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data[0]["level"] == "ERROR"
+    assert data[0]["similarity_score"] == pytest.approx(0.75)
+    assert data[0]["meta_json"] == {"unit": "sda1", "pct": 99}
+
+
+@pytest.mark.asyncio
+async def test_search_logs_binds_vector_before_filters():
+    """The vector placeholder precedes WHERE, so it must be the first param."""
+    from unittest.mock import AsyncMock
+    cursors = []
+
+    class RecordingRowConnection(RowConnection):
+        def cursor(self, *args, **kwargs):
+            cursors.append(super().cursor(*args, **kwargs))
+            return cursors[-1]
+
+    row = dict(SAMPLE_DB_ROW, distance=0.25)
+    mock_pool = MockPool(RecordingRowConnection([row]))
+    with patch("db.database._pool", mock_pool), \
+         patch("api.routes.embed_text", new=AsyncMock(return_value=[0.5, 0.25])):
+        from main import app
+        app.state.http_client = object()
+        try:
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as c:
+                resp = await c.get("/search/logs", params={
+                    "query": "disk full", "host": "node-1", "level": "ERROR", "limit": 5})
+        finally:
+            del app.state.http_client
+    assert resp.status_code == 200
+    sql, params = next((sql, params) for cur in cursors for sql, params in cur._executed
+                       if "VEC_DISTANCE_COSINE" in sql)
+    assert params == ["[0.5,0.25]", "node-1", "ERROR", 5]
+    assert sql.count("%s") == len(params)
+    assert sql.index("VEC_FromText(%s)") < sql.index("host = %s") < sql.index("level = %s")
+
+
+class TemplateSearchCursor(RowCursor):
+    """Returns two matching templates; their examples are SAMPLE_DB_ROW variants."""
+
+    async def execute(self, sql, params=None):
+        await super().execute(sql, params)
+        if "FROM log_templates" in sql:
+            self.results = [
+                {"id": 5, "canonical_text": "disk full", "service": "test.service",
+                 "level": "ERROR", "event_count": 12, "distance": 0.1},
+                {"id": 6, "canonical_text": "disk ok", "service": "test.service",
+                 "level": "INFO", "event_count": 3, "distance": 0.4},
+            ]
+        elif "UNION ALL" in sql:
+            # Out of timestamp order, as UNION ALL may return them
+            self.results = [
+                dict(SAMPLE_DB_ROW, template_id=5),
+                dict(SAMPLE_DB_ROW, id=43, template_id=6),
+                dict(SAMPLE_DB_ROW, id=44, template_id=5,
+                     timestamp=datetime(2025, 12, 1, 13, 0, 0)),
+            ]
+
+
+class TemplateSearchConnection(RowConnection):
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.executed: list = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = TemplateSearchCursor(self._rows)
+        cursor._executed = self.executed
+        return cursor
+
+
+@pytest.mark.asyncio
+async def test_search_templates_returns_examples():
+    """Template search should return templates with decoded example events."""
+    from unittest.mock import AsyncMock
+    conn = TemplateSearchConnection([SAMPLE_DB_ROW])
+    mock_pool = MockPool(conn)
+    with patch("db.database._pool", mock_pool), \
+         patch("api.routes.embed_text", new=AsyncMock(return_value=[0.1, 0.2])), \
+         patch.multiple("api.routes", _schema_loaded=True, _has_templates_table=True):
+        from main import app
+        app.state.http_client = object()
+        try:
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as c:
+                resp = await c.get("/search/templates", params={"query": "disk full"})
+        finally:
+            del app.state.http_client
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data[0]["template_id"] == 5
+    assert data[0]["similarity_score"] == pytest.approx(0.9)
+    # Newest example first, grouped under the right template
+    assert [e["id"] for e in data[0]["example_events"]] == [44, 42]
+    assert [e["id"] for e in data[1]["example_events"]] == [43]
+    assert data[0]["example_events"][0]["meta_json"] == {"unit": "sda1", "pct": 99}
+    # All examples fetched in a single statement
+    example_queries = [(sql, params) for sql, params in conn.executed if "UNION ALL" in sql]
+    assert len(example_queries) == 1
+    assert example_queries[0][1] == [5, 3, 6, 3]
+
+
+@pytest.mark.asyncio
+async def test_ingest_skips_python_hash_with_event_hash(client, sample_log_batch):
+    """With event_hash present, ingest should not compute log_hash per row."""
+    import api.routes
+    with patch.multiple("api.routes", _schema_loaded=True, _has_hash_column=True,
+                        _has_event_hash_column=True, _has_embedding_column=False,
+                        _has_templates_table=False, _has_template_id_column=False), \
+         patch("api.routes.compute_log_hashes") as mock_hash:
+        resp = await client.post("/ingest/logs", json=sample_log_batch)
+    assert resp.status_code == 201
+    mock_hash.assert_not_called()
+
+
+def test_vec_to_text_format():
+    """Vectors should serialize to the bracketed text VEC_FromText expects."""
+    from array import array
+    from api.routes import _vec_to_text
+    assert _vec_to_text([0.5, -1.0, 0.25]) == "[0.5,-1.0,0.25]"
+    assert _vec_to_text(array("f", [0.5, -1.0])) == "[0.5,-1.0]"
+
+
+def test_vec_literal_escapes_verbatim():
+    """Bulk INSERT vectors should be quoted as-is by the driver's escaper."""
+    from pymysql.converters import escape_item
+    from api.routes import _vec_literal
+    assert escape_item(_vec_literal([0.5, -1.0, 1e-05]), "utf8mb4") == "'[0.5,-1.0,0.00001]'"
+
+
+def test_vec_literal_rejects_non_numeric():
+    """Non-number elements should raise before reaching the unescaped literal."""
+    from api.routes import _vec_literal
+    with pytest.raises(TypeError):
+        _vec_literal([0.1, "a'),(1,2) -- "])
+
+
+class TemplateCursor(MockCursor):
+    """Cursor backed by a dict of template_hash -> id for _resolve_templates."""
+
+    def __init__(self, templates: dict, inserted: list):
+        super().__init__()
+        self.templates = templates
+        self.inserted = inserted
+
+    def mogrify(self, sql, params=None):
+        from api.routes import _TEMPLATE_ROW_SQL
+        if sql == _TEMPLATE_ROW_SQL:
+            self.inserted.append(params)
+            self.templates.setdefault(params[0], 100 + len(self.templates))
+        return super().mogrify(sql, params)
+
+    async def execute(self, sql, params=None):
+        if "SELECT id, template_hash FROM log_templates" in sql:
+            self._executed.append((sql, params))
+            self.results = [{"id": self.templates[h], "template_hash": h}
+                            for h in params if h in self.templates]
+            return
+        await super().execute(sql, params)
+
+
+class TemplateConnection(MockConnection):
+    def __init__(self, templates: dict):
+        self.templates = templates
+        self.executed: list = []
+        self.inserted: list = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = TemplateCursor(self.templates, self.inserted)
+        cursor._executed = self.executed
+        return cursor
+
+
+class CountingPool(MockPool):
+    """MockPool that counts acquire() calls."""
+
+    def __init__(self, conn=None):
+        super().__init__(conn)
+        self.acquires = 0
+
+    def acquire(self):
+        self.acquires += 1
+        return super().acquire()
+
+
+@pytest.mark.asyncio
+async def test_resolve_templates_batches_new_inserts():
+    """New templates should go out in one INSERT and map back to their ids."""
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock
+    from api.routes import _resolve_templates
+    from services.template_cache import TemplateCache
+
+    conn = TemplateConnection({})
+    cache = TemplateCache()
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(
+        template_cache=cache, http_client=object())))
+    ts = datetime(2025, 12, 1, 12, 0, 0)
+    logs = [
+        LogEventCreate(timestamp=ts, source="journald", service="sshd", host="node-1",
+                       level="INFO", message=msg)
+        for msg in ("Connection from 10.0.0.1 port 22",
+                    "Connection from 10.0.0.2 port 22",
+                    "request id=550e8400-e29b-41d4-a716-446655440000 done")
+    ]
+    with patch("api.routes.embed_batch", AsyncMock(return_value=[[0.1], [0.2]])):
+        ids = await _resolve_templates(request, MockPool(conn), logs)
+
+    inserts = [sql for sql, _ in conn.executed if "INSERT" in sql and "log_templates" in sql]
+    assert len(inserts) == 1
+    # New templates carry their batch count; nothing to UPDATE
+    assert [row[9] for row in conn.inserted] == [2, 1]
+    assert not [sql for sql, _ in conn.executed if "UPDATE log_templates" in sql]
+    assert ids[0] == ids[1] != ids[2]
+    assert None not in ids
+    assert cache.size == 2
+
+
+@pytest.mark.asyncio
+async def test_resolve_templates_skips_templates_found_in_db():
+    """Templates already in the DB should resolve without being re-embedded."""
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock
+    from api.routes import _resolve_templates
+    from services.canonicalize import template_key
+    from services.template_cache import TemplateCache
+
+    ts = datetime(2025, 12, 1, 12, 0, 0)
+    logs = [
+        LogEventCreate(timestamp=ts, source="journald", service="sshd", host="node-1",
+                       level="INFO", message=msg)
+        for msg in ("Connection from 10.0.0.1 port 22", "cache miss")
+    ]
+    existing_hash = template_key(logs[0].message, "sshd", "INFO")[1]
+    conn = TemplateConnection({existing_hash: 7})
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(
+        template_cache=TemplateCache(), http_client=object())))
+    mock_embed = AsyncMock(return_value=[[0.1]])
+    pool = CountingPool(conn)
+    with patch("api.routes.embed_batch", mock_embed):
+        ids = await _resolve_templates(request, pool, logs)
+
+    mock_embed.assert_awaited_once_with(request.app.state.http_client, ["cache miss"])
+    assert ids[0] == 7
+    assert ids[1] not in (None, 7)
+    # Only the pre-existing template gets a counter UPDATE
+    updates = [params for sql, params in conn.executed if "UPDATE log_templates" in sql]
+    assert updates == [[existing_hash, 1, existing_hash, ts, existing_hash]]
+    # Lookup + UPDATE share one connection; the insert takes the second
+    assert pool.acquires == 2
+
+
+@pytest.mark.asyncio
+async def test_request_log_single_line_and_probe_sampling(async_client, caplog, monkeypatch):
+    """Each request logs one line with latency; successful probes are sampled."""
+    import itertools
+    import main
+    # Start past the sampled hit so none of the five /info calls is logged
+    monkeypatch.setattr(main, "_probe_hits", itertools.count(1))
+
+    with caplog.at_level("INFO", logger="main"):
+        await async_client.get("/")
+        for _ in range(5):
+            await async_client.get("/info")
+
+    lines = [r.getMessage() for r in caplog.records if r.name == "main"]
+    assert len([line for line in lines if line.startswith("GET / 200 ")]) == 1
+    assert lines[0].endswith("ms")
+    assert not [line for line in lines if line.startswith("GET /info")]